@@ -11,54 +11,28 @@ This script demonstrates:
 
 import os
 
-import pandas as pd
-from pyiceberg.catalog import load_catalog
+from pyiceberg.partitioning import PartitionField, PartitionSpec
 from pyiceberg.schema import Schema
+from pyiceberg.transforms import DayTransform
 from pyiceberg.types import (IntegerType, LongType, NestedField, StringType,
                              TimestampType)
 
+from catalog_config import WAREHOUSE_PATH, get_catalog
 
-def setup_catalog():
-    """Initialize the Iceberg catalog"""
-    # Ensure warehouse directory exists (using data/warehouse for better organization)
-    warehouse_path = os.path.abspath("data/warehouse")
-    os.makedirs(warehouse_path, exist_ok=True)
-
-    # Try direct instantiation approach first
-    try:
-        catalog = load_catalog(
-            "default",
-            **{
-                "type": "sql",
-                "uri": f"sqlite:///{warehouse_path}/pyiceberg_catalog.db",
-                "warehouse": f"file://{warehouse_path}",
-            }
-        )
-        print("✅ Catalog initialized with SQLite backend (direct)")
-        return catalog
-    except Exception as e:
-        print(f"Direct approach failed: {e}")
-
-        # Fallback: Create config file approach
-        config_content = f"""catalog:
-  default:
-    type: sql
-    uri: sqlite:///{warehouse_path}/pyiceberg_catalog.db
-    warehouse: file://{warehouse_path}
-"""
-
-        with open(".pyiceberg.yaml", "w") as f:
-            f.write(config_content)
-
-        # Set environment variable to point to current directory
-        os.environ['PYICEBERG_HOME'] = os.getcwd()
+# Parquet write settings applied to every data file the table writes.
+# PyIceberg already writes ZSTD with dictionary encoding, which suits log data
+# (repeated URLs, user agents); level 3 trades a little write time for
+# smaller files than Arrow's default ZSTD level.
+TABLE_PROPERTIES = {
+    "write.parquet.compression-level": "3",
+}
 
-        print("Created .pyiceberg.yaml config file")
 
-        # Load the catalog
-        catalog = load_catalog("default")
-        print("✅ Catalog initialized with SQLite backend (config file)")
-        return catalog
+def setup_catalog():
+    """Initialize the Iceberg catalog"""
+    catalog = get_catalog()
+    print("✅ Catalog initialized with SQLite backend")
+    return catalog
 
 def define_schema():
     """Define the schema for our web server logs table"""
@@ -76,7 +50,17 @@ def define_schema():
     print("✅ Schema defined with 7 fields")
     return schema
 
-def create_table(catalog, schema):
+def define_partition_spec():
+    """Partition the table by day so time-range filters can skip whole days"""
+    # source_id=1 is the timestamp field; partition field ids start at 1000
+    partition_spec = PartitionSpec(
+        PartitionField(source_id=1, field_id=1000, transform=DayTransform(), name="timestamp_day")
+    )
+
+    print("✅ Partition spec defined: day(timestamp)")
+    return partition_spec
+
+def create_table(catalog, schema, partition_spec):
     """Create the Iceberg table"""
 
     # Create a namespace (like a database schema)
@@ -88,14 +72,15 @@ def create_table(catalog, schema):
 
     # Create the table
     table_name = "web_logs.access_logs"
-    warehouse_path = os.path.abspath("data/warehouse")
-    table_location = os.path.join(warehouse_path, "web_logs", "access_logs")
+    table_location = os.path.join(WAREHOUSE_PATH, "web_logs", "access_logs")
 
     try:
         table = catalog.create_table(
             identifier=table_name,
             schema=schema,
-            location=f"file://{table_location}"
+            location=f"file://{table_location}",
+            partition_spec=partition_spec,
+            properties=TABLE_PROPERTIES,
         )
         print(f"✅ Created table: {table_name}")
         return table
@@ -115,6 +100,12 @@ def inspect_table_metadata(table):
         required = "required" if field.required else "optional"
         print(f"  - {field.name}: {field.field_type} ({required})")
 
+    print(f"\nPartition spec: {table.spec()}")
+
+    print(f"\nTable properties:")
+    for key, value in table.properties.items():
+        print(f"  - {key}: {value}")
+
     print(f"\nMetadata location: {table.metadata_location}")
 
     # Show current snapshots (should be empty initially)
@@ -125,11 +116,14 @@ def inspect_table_metadata(table):
 
 def peek_at_sample_data():
     """Quick look at our CSV data to understand what we're working with"""
+    import pandas as pd  # Imported here: only this preview uses pandas
+
     print("\n" + "="*50)
     print("SAMPLE DATA PREVIEW")
     print("="*50)
 
-    df = pd.read_csv("logs/access_log_day1.csv")
+    # Arrow-backed dtypes: strings stay in Arrow buffers instead of Python objects
+    df = pd.read_csv("logs/access_log_day1.csv", engine="pyarrow", dtype_backend="pyarrow")
     print(f"Day 1 data shape: {df.shape}")
     print("\nFirst 3 rows:")
     print(df.head(3).to_string())
@@ -137,8 +131,11 @@ def peek_at_sample_data():
     print(f"\nData types in CSV:")
     print(df.dtypes)
 
-def main():
-    """Main execution flow"""
+def main(catalog=None):
+    """Main execution flow
+
+    Pass an existing catalog to reuse it (see run_pipeline.py).
+    """
     print("🚀 Creating your first Iceberg table!")
     print("-" * 50)
 
@@ -152,13 +149,15 @@ def main():
         return
 
     # Step 1: Setup catalog
-    catalog = setup_catalog()
+    if catalog is None:
+        catalog = setup_catalog()
 
     # Step 2: Define schema
     schema = define_schema()
 
-    # Step 3: Create table
-    table = create_table(catalog, schema)
+    # Step 3: Create table, partitioned by day
+    partition_spec = define_partition_spec()
+    table = create_table(catalog, schema, partition_spec)
 
     # Step 4: Inspect the table
     inspect_table_metadata(table)
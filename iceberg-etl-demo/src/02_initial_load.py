@@ -12,89 +12,88 @@ This script demonstrates:
 import os
 from datetime import datetime
 
-import duckdb
-import pandas as pd
 import pyarrow as pa
-from pyiceberg.catalog import load_catalog
-
-
-def get_catalog():
-    """Load the existing catalog"""
-    # Ensure warehouse directory exists
-    warehouse_path = os.path.abspath("data/warehouse")
-
-    # Set environment variable to point to current directory
-    os.environ['PYICEBERG_HOME'] = os.getcwd()
-
-    # Check if .pyiceberg.yaml exists, if not create it
-    if not os.path.exists(".pyiceberg.yaml"):
-        config_content = f"""catalog:
-  default:
-    type: sql
-    uri: sqlite:///{warehouse_path}/pyiceberg_catalog.db
-    warehouse: file://{warehouse_path}
-"""
-        with open(".pyiceberg.yaml", "w") as f:
-            f.write(config_content)
-        print("ℹ️  Created .pyiceberg.yaml config file")
-
-    # Try direct approach first, fallback to config file approach
-    try:
-        catalog = load_catalog(
-            "default",
-            **{
-                "type": "sql",
-                "uri": f"sqlite:///{warehouse_path}/pyiceberg_catalog.db",
-                "warehouse": f"file://{warehouse_path}",
-            }
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+
+from catalog_config import get_catalog
+from demo_helpers import (LOG_TIMESTAMP_FORMAT, connect_duckdb,
+                          count_values, load_iceberg_extension)
+
+# Explicit schema that matches the Iceberg table
+# This ensures field types and nullability match exactly
+ACCESS_LOG_SCHEMA = pa.schema([
+    pa.field('timestamp', pa.timestamp('us'), nullable=False),  # required timestamp
+    pa.field('ip_address', pa.string(), nullable=False),        # required string
+    pa.field('method', pa.string(), nullable=False),            # required string
+    pa.field('url', pa.string(), nullable=False),               # required string
+    pa.field('status_code', pa.int32(), nullable=False),        # required int
+    pa.field('response_size', pa.int64(), nullable=False),      # required long
+    pa.field('user_agent', pa.string(), nullable=True),         # optional string
+])
+
+# Record batches are buffered up to this size before each append, keeping
+# memory bounded for large files while small files still load as one snapshot
+APPEND_CHUNK_BYTES = 128 << 20
+
+
+def prepare_data(csv_files):
+    """Stream one or more CSV files as Arrow record batches for Iceberg ingestion
+
+    Batches from all files flow into a single append (one snapshot) rather
+    than one snapshot per file.
+    """
+    # Parse the CSV straight into Arrow columns with the target types,
+    # so there is no pandas DataFrame to build and convert afterwards
+    convert_options = pacsv.ConvertOptions(
+        column_types={field.name: field.type for field in ACCESS_LOG_SCHEMA},
+        strings_can_be_null=True,
+        # Match generate_logs.py output exactly instead of inferring the format
+        timestamp_parsers=[LOG_TIMESTAMP_FORMAT, pacsv.ISO8601],
+    )
+    read_options = pacsv.ReadOptions(block_size=4 << 20)
+
+    for csv_file in csv_files:
+        print(f"📁 Loading data from {csv_file}")
+        # open_csv reads one block at a time instead of the whole file
+        yield from pacsv.open_csv(
+            csv_file, read_options=read_options, convert_options=convert_options
         )
-        return catalog
-    except Exception:
-        # Fallback to config file approach
-        return load_catalog("default")
-
-def prepare_data(csv_file):
-    """Load and prepare CSV data for Iceberg ingestion"""
-    print(f"📁 Loading data from {csv_file}")
-
-    # Load CSV
-    df = pd.read_csv(csv_file)
-
-    # Convert timestamp column to proper datetime
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-
-    # Ensure data types match what Iceberg expects
-    df['status_code'] = df['status_code'].astype('int32')  # Iceberg expects int, not long
-    df['response_size'] = df['response_size'].astype('int64')  # Keep as long
-
-    # Convert to PyArrow Table with explicit schema that matches Iceberg table
-    # This ensures field types and nullability match exactly
-    schema = pa.schema([
-        pa.field('timestamp', pa.timestamp('us'), nullable=False),  # required timestamp
-        pa.field('ip_address', pa.string(), nullable=False),        # required string
-        pa.field('method', pa.string(), nullable=False),            # required string
-        pa.field('url', pa.string(), nullable=False),               # required string
-        pa.field('status_code', pa.int32(), nullable=False),        # required int
-        pa.field('response_size', pa.int64(), nullable=False),      # required long
-        pa.field('user_agent', pa.string(), nullable=True),         # optional string
-    ])
-
-    # Create PyArrow table with explicit schema
-    arrow_table = pa.Table.from_pandas(df, schema=schema)
-
-    print(f"✅ Prepared {len(df)} records")
-    print(f"   Date range: {df['timestamp'].min()} to {df['timestamp'].max()}")
-    print(f"   Schema: All required fields marked as non-nullable")
 
-    return arrow_table
-
-def load_data_to_iceberg(table, arrow_table):
+def load_data_to_iceberg(table, batches):
     """Insert data into the Iceberg table"""
     print("💾 Loading data into Iceberg table...")
 
-    # This creates a new snapshot
-    table.append(arrow_table)
-
+    total_records = 0
+    min_ts = max_ts = None
+
+    def flush(batches):
+        # Apply the nullability from the target schema, then append.
+        # Each append creates a new snapshot
+        chunk = pa.Table.from_batches(batches).cast(ACCESS_LOG_SCHEMA)
+        table.append(chunk)
+
+    pending, pending_bytes = [], 0
+    for batch in batches:
+        total_records += batch.num_rows
+        batch_range = pc.min_max(batch.column('timestamp'))
+        if min_ts is None or batch_range['min'].as_py() < min_ts:
+            min_ts = batch_range['min'].as_py()
+        if max_ts is None or batch_range['max'].as_py() > max_ts:
+            max_ts = batch_range['max'].as_py()
+
+        pending.append(batch)
+        pending_bytes += batch.nbytes
+        if pending_bytes >= APPEND_CHUNK_BYTES:
+            flush(pending)
+            pending, pending_bytes = [], 0
+
+    if pending:
+        flush(pending)
+
+    print(f"✅ Streamed {total_records} records")
+    print(f"   Date range: {min_ts} to {max_ts}")
+    print(f"   Schema: All required fields marked as non-nullable")
     print("✅ Data loaded successfully!")
     return table
 
@@ -120,37 +119,37 @@ def inspect_table_after_load(table):
         print(f"\nData files in current snapshot:")
         scan = table.scan()
 
-        # Try the newer API first
+        # Try the newer API first (reads manifests only, not Parquet data)
         if hasattr(scan, 'plan_files'):
-            files = list(scan.plan_files())
+            files = [task.file for task in scan.plan_files()]
             print(f"Number of data files: {len(files)}")
+            print(f"Total records: {sum(data_file.record_count for data_file in files)}")
 
-            for i, file_info in enumerate(files[:3]):  # Show first 3 files
-                print(f"  File {i+1}: {file_info.file_path.split('/')[-1]}")
-                print(f"    Records: {file_info.record_count}")
-                print(f"    Size: {file_info.file_size_in_bytes} bytes")
-        else:
-            # Fallback to basic info
-            to_arrow_result = scan.to_arrow()
-            print(f"Successfully scanned table with {len(to_arrow_result)} records")
+            for i, data_file in enumerate(files[:3]):  # Show first 3 files
+                print(f"  File {i+1}: {data_file.file_path.split('/')[-1]}")
+                print(f"    Records: {data_file.record_count}")
+                print(f"    Size: {data_file.file_size_in_bytes} bytes")
+        elif current_snapshot:
+            # Fallback to the record count kept in the snapshot summary
+            total_records = current_snapshot.summary.get('total-records')
+            print(f"Table has {total_records} records (from snapshot summary)")
 
     except Exception as e:
         print(f"Could not inspect data files (this is OK): {e}")
         print("Table data is still loaded successfully!")
 
-def query_data_with_duckdb(table):
+def query_data_with_duckdb(conn, table):
     """Query the Iceberg table using DuckDB"""
     print("\n" + "="*50)
     print("QUERYING DATA WITH DUCKDB")
     print("="*50)
 
-    # Connect to DuckDB
-    conn = duckdb.connect()
-
     try:
-        # Install and load iceberg extension
-        conn.execute("INSTALL iceberg")
-        conn.execute("LOAD iceberg")
+        if conn is None:
+            raise RuntimeError("DuckDB is not installed")
+
+        # Install (first run only) and load iceberg extension
+        load_iceberg_extension(conn)
 
         # Enable version guessing for local development (as suggested in error)
         conn.execute("SET unsafe_enable_version_guessing = true")
@@ -159,10 +158,13 @@ def query_data_with_duckdb(table):
         table_location = table.location()
         print(f"Reading Iceberg table from: {table_location}")
 
-        # Register the table with DuckDB
+        # Scan the Iceberg table once into a temp table; the queries below
+        # aggregate over it instead of re-reading manifests and Parquet files.
+        # Only the columns the queries use are read (wide user_agent is skipped)
         conn.execute(f"""
-            CREATE VIEW access_logs AS
-            SELECT * FROM iceberg_scan('{table_location}')
+            CREATE OR REPLACE TEMP TABLE access_logs AS
+            SELECT timestamp, url, status_code
+            FROM iceberg_scan('{table_location}')
         """)
 
         # Run some basic queries
@@ -209,23 +211,21 @@ def query_data_with_duckdb(table):
         print("-" * 40)
 
         try:
-            # Get data as PyArrow table
-            arrow_data = table.scan().to_arrow()
-            df = arrow_data.to_pandas()
+            # Read only the columns we aggregate, then count with Arrow kernels
+            arrow_data = table.scan(selected_fields=("status_code", "url")).to_arrow()
 
-            print(f"Total records: {len(df)}")
+            print(f"Total records: {arrow_data.num_rows}")
             print(f"\nStatus code distribution:")
-            print(df['status_code'].value_counts().sort_values(ascending=False))
+            for status_code, count in count_values(arrow_data['status_code']).items():
+                print(f"  {status_code}: {count}")
 
             print(f"\nTop 5 URLs:")
-            print(df['url'].value_counts().head(5))
+            for url, count in list(count_values(arrow_data['url']).items())[:5]:
+                print(f"  {url}: {count}")
 
         except Exception as e2:
             print(f"Direct query also failed: {e2}")
 
-    finally:
-        conn.close()
-
 def explore_file_structure():
     """Show what Iceberg created on disk"""
     print("\n" + "="*50)
@@ -236,47 +236,57 @@ def explore_file_structure():
         if current_depth > max_depth:
             return
 
-        items = sorted(os.listdir(path))
-        for i, item in enumerate(items):
-            item_path = os.path.join(path, item)
-            is_last = i == len(items) - 1
+        # scandir entries cache their type and stat info, saving a stat per item
+        with os.scandir(path) as it:
+            entries = sorted(it, key=lambda entry: entry.name)
+
+        for i, entry in enumerate(entries):
+            is_last = i == len(entries) - 1
             current_prefix = "└── " if is_last else "├── "
 
-            if os.path.isdir(item_path):
-                print(f"{prefix}{current_prefix}{item}/")
+            if entry.is_dir(follow_symlinks=False):
+                print(f"{prefix}{current_prefix}{entry.name}/")
                 next_prefix = prefix + ("    " if is_last else "│   ")
-                show_directory_tree(item_path, next_prefix, max_depth, current_depth + 1)
+                show_directory_tree(entry.path, next_prefix, max_depth, current_depth + 1)
             else:
-                size = os.path.getsize(item_path)
-                print(f"{prefix}{current_prefix}{item} ({size} bytes)")
+                size = entry.stat().st_size
+                print(f"{prefix}{current_prefix}{entry.name} ({size} bytes)")
 
     print("data/")
     if os.path.exists("data"):
         show_directory_tree("data")
 
-def main():
-    """Main execution flow"""
+def main(catalog=None):
+    """Main execution flow
+
+    Pass an existing catalog to reuse it (see run_pipeline.py).
+    """
     print("📊 Loading initial data into Iceberg table")
     print("-" * 50)
 
     # Load catalog and table
-    catalog = get_catalog()
+    if catalog is None:
+        catalog = get_catalog()
     table = catalog.load_table("web_logs.access_logs")
 
-    # Load and prepare data
-    arrow_table = prepare_data("logs/access_log_day1.csv")
+    # Stream the CSV files as record batches (add more days to load them together)
+    batches = prepare_data(["logs/access_log_day1.csv"])
 
     # Load data into Iceberg
-    table = load_data_to_iceberg(table, arrow_table)
+    table = load_data_to_iceberg(table, batches)
 
-    # Refresh table metadata
-    table = catalog.load_table("web_logs.access_logs")
+    # No reload needed: append() refreshes the table object in place
 
     # Inspect table after loading
     inspect_table_after_load(table)
 
-    # Query the data
-    query_data_with_duckdb(table)
+    # Query the data with a single DuckDB connection
+    conn = connect_duckdb()
+    try:
+        query_data_with_duckdb(conn, table)
+    finally:
+        if conn is not None:
+            conn.close()
 
     # Show file structure
     explore_file_structure()
@@ -10,32 +10,35 @@ This script demonstrates:
 """
 
 import os
-import random
 from datetime import datetime
 
-import duckdb
-import pandas as pd
+import numpy as np
 import pyarrow as pa
-from pyiceberg.catalog import load_catalog
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
 from pyiceberg.types import BooleanType, NestedField, StringType
 
+from catalog_config import get_catalog
+from demo_helpers import (LOG_TIMESTAMP_FORMAT, connect_duckdb,
+                          count_values, load_iceberg_extension)
 
-def get_catalog():
-    """Load the existing catalog"""
-    warehouse_path = os.path.abspath("data/warehouse")
-    os.environ['PYICEBERG_HOME'] = os.getcwd()
+# Fixed seed so the simulated enrichment is reproducible between runs
+RANDOM_SEED = 42
 
-    if not os.path.exists(".pyiceberg.yaml"):
-        config_content = f"""catalog:
-  default:
-    type: sql
-    uri: sqlite:///{warehouse_path}/pyiceberg_catalog.db
-    warehouse: file://{warehouse_path}
-"""
-        with open(".pyiceberg.yaml", "w") as f:
-            f.write(config_content)
+# PyArrow schema with the new fields
+ENHANCED_LOG_SCHEMA = pa.schema([
+    pa.field('timestamp', pa.timestamp('us'), nullable=False),
+    pa.field('ip_address', pa.string(), nullable=False),
+    pa.field('method', pa.string(), nullable=False),
+    pa.field('url', pa.string(), nullable=False),
+    pa.field('status_code', pa.int32(), nullable=False),
+    pa.field('response_size', pa.int64(), nullable=False),
+    pa.field('user_agent', pa.string(), nullable=True),
+    pa.field('user_country', pa.string(), nullable=True),  # New field
+    pa.field('browser', pa.string(), nullable=True),       # New field
+    pa.field('is_mobile', pa.bool_(), nullable=True),      # New field
+])
 
-    return load_catalog("default")
 
 def show_current_schema(table):
     """Display the current table schema"""
@@ -52,14 +55,14 @@ def show_current_schema(table):
 
     return schema
 
-def evolve_schema_add_fields(table):
-    """Add new fields to demonstrate schema evolution"""
+def evolve_schema_add_fields(txn):
+    """Add new fields to demonstrate schema evolution (staged in a transaction)"""
     print("\n" + "="*50)
     print("EVOLVING SCHEMA - ADDING NEW FIELDS")
     print("="*50)
 
     # Check current schema to see what fields already exist
-    current_schema = table.schema()
+    current_schema = txn.table_metadata.schema()
     existing_fields = {field.name for field in current_schema.fields}
 
     # Define the fields we want to add
@@ -72,22 +75,21 @@ def evolve_schema_add_fields(table):
     print("Checking which fields need to be added:")
 
     # Only add fields that don't already exist
-    fields_added = []
-    with table.update_schema() as update:
-        for field_name, field_type, field_doc in fields_to_add:
-            if field_name not in existing_fields:
-                update.add_column(field_name, field_type, doc=field_doc)
-                fields_added.append(field_name)
-                print(f"  ✅ Adding: {field_name}")
-            else:
-                print(f"  ⏭️  Skipping: {field_name} (already exists)")
-
-    if fields_added:
-        print(f"✅ Schema evolved! Added {len(fields_added)} new fields: {fields_added}")
-    else:
+    missing = [field for field in fields_to_add if field[0] not in existing_fields]
+    if not missing:
+        # Skip update_schema() entirely so re-runs don't stage an empty schema change
         print("ℹ️  Schema already has all target fields - no changes needed")
+        return txn
+
+    with txn.update_schema() as update:
+        for field_name, field_type, field_doc in missing:
+            update.add_column(field_name, field_type, doc=field_doc)
+            print(f"  ✅ Adding: {field_name}")
+
+    fields_added = [field_name for field_name, _, _ in missing]
+    print(f"✅ Schema evolved! Added {len(fields_added)} new fields: {fields_added}")
 
-    return table
+    return txn
 
 def generate_enhanced_data():
     """Generate day 2 data with the new fields"""
@@ -100,92 +102,95 @@ def generate_enhanced_data():
         print("❌ logs/access_log_day2.csv not found. Please generate it first.")
         return None
 
-    df = pd.read_csv("logs/access_log_day2.csv")
-    print(f"📁 Loaded {len(df)} records from day 2")
+    # Parse the CSV directly into typed Arrow columns
+    convert_options = pacsv.ConvertOptions(
+        column_types={field.name: field.type for field in ENHANCED_LOG_SCHEMA},
+        strings_can_be_null=True,
+        # Match generate_logs.py output exactly instead of inferring the format
+        timestamp_parsers=[LOG_TIMESTAMP_FORMAT, pacsv.ISO8601],
+    )
+    arrow_table = pacsv.read_csv("logs/access_log_day2.csv", convert_options=convert_options)
+    num_rows = arrow_table.num_rows
+    print(f"📁 Loaded {num_rows} records from day 2")
 
     # Add the new fields with some realistic sample data
     countries = ['US', 'CA', 'UK', 'DE', 'FR', 'JP', 'AU', 'BR']
     browsers = ['Chrome', 'Safari', 'Firefox', 'Edge', 'Chrome Mobile']
 
-    # Simulate parsing country from IP (in reality, you'd use a geo-IP service)
-    df['user_country'] = [random.choice(countries) for _ in range(len(df))]
+    rng = np.random.default_rng(RANDOM_SEED)
+
+    # Simulate parsing country from IP (in reality, you'd use a geo-IP service).
+    # Random integer codes index into the value list as a dictionary array
+    country_codes = rng.integers(0, len(countries), size=num_rows, dtype=np.int32)
+    user_country = pa.DictionaryArray.from_arrays(country_codes, countries)
 
     # Simulate parsing browser from user agent
-    df['browser'] = [random.choice(browsers) for _ in range(len(df))]
+    browser_codes = rng.integers(0, len(browsers), size=num_rows, dtype=np.int32)
+    browser = pa.DictionaryArray.from_arrays(browser_codes, browsers)
 
     # Simulate mobile detection (mobile if user agent contains "Mobile" or browser is "Chrome Mobile")
-    df['is_mobile'] = df.apply(lambda row:
-        'Mobile' in str(row['user_agent']) or row['browser'] == 'Chrome Mobile', axis=1)
+    mobile_agent = pc.fill_null(pc.match_substring(arrow_table['user_agent'], 'Mobile'), False)
+    is_mobile = pc.or_(mobile_agent, pc.equal(browser, 'Chrome Mobile'))
+
+    arrow_table = (arrow_table
+                   .append_column('user_country', user_country)
+                   .append_column('browser', browser)
+                   .append_column('is_mobile', is_mobile))
 
+    mobile_count = pc.sum(is_mobile).as_py()
     print("✅ Enhanced data with new fields:")
-    print(f"   - Countries: {df['user_country'].value_counts().to_dict()}")
-    print(f"   - Browsers: {df['browser'].value_counts().to_dict()}")
-    print(f"   - Mobile users: {df['is_mobile'].sum()}/{len(df)} ({df['is_mobile'].mean():.1%})")
+    print(f"   - Countries: {count_values(arrow_table['user_country'])}")
+    print(f"   - Browsers: {count_values(arrow_table['browser'])}")
+    print(f"   - Mobile users: {mobile_count}/{num_rows} ({mobile_count / num_rows:.1%})")
 
-    return df
+    return arrow_table
 
-def prepare_enhanced_data(df):
+def prepare_enhanced_data(arrow_table):
     """Prepare the enhanced data for Iceberg"""
     print("\n💾 Preparing enhanced data for Iceberg...")
 
-    # Convert timestamp
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-
-    # Ensure proper data types
-    df['status_code'] = df['status_code'].astype('int32')
-    df['response_size'] = df['response_size'].astype('int64')
-    df['is_mobile'] = df['is_mobile'].astype('bool')
-
-    # Create PyArrow schema with new fields
-    schema = pa.schema([
-        pa.field('timestamp', pa.timestamp('us'), nullable=False),
-        pa.field('ip_address', pa.string(), nullable=False),
-        pa.field('method', pa.string(), nullable=False),
-        pa.field('url', pa.string(), nullable=False),
-        pa.field('status_code', pa.int32(), nullable=False),
-        pa.field('response_size', pa.int64(), nullable=False),
-        pa.field('user_agent', pa.string(), nullable=True),
-        pa.field('user_country', pa.string(), nullable=True),  # New field
-        pa.field('browser', pa.string(), nullable=True),       # New field
-        pa.field('is_mobile', pa.bool_(), nullable=True),      # New field
-    ])
-
-    arrow_table = pa.Table.from_pandas(df, schema=schema)
+    # Columns are already typed; this applies the nullability of the new schema.
+    # Iceberg has no dictionary type, so the generated dictionary columns are
+    # decoded to plain strings here (Parquet dictionary-encodes them again on write)
+    arrow_table = arrow_table.cast(ENHANCED_LOG_SCHEMA)
     print("✅ Enhanced data prepared with new schema")
 
     return arrow_table
 
-def load_enhanced_data(table, arrow_table):
-    """Load the enhanced data into the table"""
+def load_enhanced_data(txn, arrow_table):
+    """Load the enhanced data into the table (staged in a transaction)"""
     print("\n💾 Loading enhanced data into Iceberg table...")
 
     # This will work even though we added new fields!
-    table.append(arrow_table)
+    txn.append(arrow_table)
 
     print("✅ Enhanced data loaded successfully!")
     print("   - Old data still accessible")
     print("   - New data has additional fields")
     print("   - Queries work across both versions")
 
-    return table
+    return txn
 
-def query_evolved_data(table):
+def query_evolved_data(conn, table):
     """Query data across schema versions"""
     print("\n" + "="*50)
     print("QUERYING ACROSS SCHEMA VERSIONS")
     print("="*50)
 
-    conn = duckdb.connect()
-
     try:
-        conn.execute("INSTALL iceberg")
-        conn.execute("LOAD iceberg")
+        if conn is None:
+            raise RuntimeError("DuckDB is not installed")
+
+        load_iceberg_extension(conn)
         conn.execute("SET unsafe_enable_version_guessing = true")
 
+        # Scan the Iceberg table once; every query below reuses this temp table.
+        # Project only the columns the queries reference
         table_location = table.location()
         conn.execute(f"""
-            CREATE VIEW access_logs AS
-            SELECT * FROM iceberg_scan('{table_location}')
+            CREATE OR REPLACE TEMP TABLE access_logs AS
+            SELECT status_code, user_country, browser, is_mobile
+            FROM iceberg_scan('{table_location}')
         """)
 
         queries = [
@@ -257,26 +262,25 @@ def query_evolved_data(table):
         print("-" * 40)
 
         try:
-            arrow_data = table.scan().to_arrow()
-            df = arrow_data.to_pandas()
+            # Check for new fields in the schema (metadata only, no data read)
+            has_country = 'user_country' in {field.name for field in table.schema().fields}
 
-            print(f"Total records: {len(df)}")
+            # Read a single narrow column instead of every field
+            column = 'user_country' if has_country else 'status_code'
+            arrow_data = table.scan(selected_fields=(column,)).to_arrow()
 
-            # Check for new fields
-            has_country = 'user_country' in df.columns
+            print(f"Total records: {arrow_data.num_rows}")
             print(f"Has enhanced fields: {has_country}")
 
             if has_country:
                 print("\nCountry distribution:")
-                country_counts = df['user_country'].value_counts()
-                print(country_counts)
+                country_counts = count_values(pc.drop_null(arrow_data['user_country']))
+                for country, count in country_counts.items():
+                    print(f"  {country}: {count}")
 
         except Exception as e2:
             print(f"Direct query failed: {e2}")
 
-    finally:
-        conn.close()
-
 def show_schema_history(table):
     """Show the evolution of the table schema"""
     print("\n" + "="*50)
@@ -305,39 +309,47 @@ def show_schema_history(table):
     print("   - New fields are nullable for old data")
     print("   - No data migration required")
 
-def main():
-    """Main execution flow"""
+def main(catalog=None):
+    """Main execution flow
+
+    Pass an existing catalog to reuse it (see run_pipeline.py).
+    """
     print("🔄 Demonstrating Iceberg Schema Evolution")
     print("-" * 50)
 
     # Load existing table
-    catalog = get_catalog()
+    if catalog is None:
+        catalog = get_catalog()
     table = catalog.load_table("web_logs.access_logs")
 
     # Show current schema
     show_current_schema(table)
 
-    # Evolve the schema
-    table = evolve_schema_add_fields(table)
-
-    # Show new schema
-    show_current_schema(table)
-
     # Generate enhanced data
-    enhanced_df = generate_enhanced_data()
-    if enhanced_df is None:
+    enhanced_data = generate_enhanced_data()
+    if enhanced_data is None:
         print("Cannot continue without day 2 data. Please run your data generation script.")
         return
 
-    # Prepare and load enhanced data
-    enhanced_arrow = prepare_enhanced_data(enhanced_df)
-    table = load_enhanced_data(table, enhanced_arrow)
+    # Prepare enhanced data
+    enhanced_arrow = prepare_enhanced_data(enhanced_data)
 
-    # Refresh table to see new data
-    table = catalog.load_table("web_logs.access_logs")
+    # Evolve the schema and load the enhanced data in one transaction:
+    # a single commit, so the new schema never appears without its data
+    with table.transaction() as txn:
+        evolve_schema_add_fields(txn)
+        load_enhanced_data(txn, enhanced_arrow)
 
-    # Query the evolved data
-    query_evolved_data(table)
+    # Show new schema (the commit refreshes the table object in place)
+    show_current_schema(table)
+
+    # Query the evolved data with a single DuckDB connection
+    conn = connect_duckdb()
+    try:
+        query_evolved_data(conn, table)
+    finally:
+        if conn is not None:
+            conn.close()
 
     # Show schema history
     show_schema_history(table)
@@ -10,33 +10,36 @@ This script demonstrates:
 - Understanding Iceberg's file management
 """
 
-import os
-import random
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 
-import duckdb
-import pandas as pd
+import numpy as np
 import pyarrow as pa
-from pyiceberg.catalog import load_catalog
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
 from pyiceberg.expressions import And, GreaterThanOrEqual, LessThan
 
+from catalog_config import get_catalog
+from demo_helpers import (LOG_TIMESTAMP_FORMAT, connect_duckdb,
+                          load_iceberg_extension)
+
+# Fixed seed so the enrichment and late-arriving data are reproducible
+RANDOM_SEED = 42
+_RNG = np.random.default_rng(RANDOM_SEED)
+
+# Arrow schema matching the evolved Iceberg table (after step 3)
+LOG_SCHEMA = pa.schema([
+    pa.field('timestamp', pa.timestamp('us'), nullable=False),
+    pa.field('ip_address', pa.string(), nullable=False),
+    pa.field('method', pa.string(), nullable=False),
+    pa.field('url', pa.string(), nullable=False),
+    pa.field('status_code', pa.int32(), nullable=False),
+    pa.field('response_size', pa.int64(), nullable=False),
+    pa.field('user_agent', pa.string(), nullable=True),
+    pa.field('user_country', pa.string(), nullable=True),
+    pa.field('browser', pa.string(), nullable=True),
+    pa.field('is_mobile', pa.bool_(), nullable=True),
+])
 
-def get_catalog():
-    """Load the existing catalog"""
-    warehouse_path = os.path.abspath("data/warehouse")
-    os.environ['PYICEBERG_HOME'] = os.getcwd()
-
-    if not os.path.exists(".pyiceberg.yaml"):
-        config_content = f"""catalog:
-  default:
-    type: sql
-    uri: sqlite:///{warehouse_path}/pyiceberg_catalog.db
-    warehouse: file://{warehouse_path}
-"""
-        with open(".pyiceberg.yaml", "w") as f:
-            f.write(config_content)
-
-    return load_catalog("default")
 
 def show_table_stats(table, title="TABLE STATISTICS"):
     """Show current table statistics"""
@@ -44,8 +47,12 @@ def show_table_stats(table, title="TABLE STATISTICS"):
     print(title)
     print("="*50)
 
-    # Get current snapshot
-    current_snapshot = table.current_snapshot()
+    # Read the snapshot list once and find the current snapshot in it
+    metadata = table.metadata
+    snapshots = metadata.snapshots
+    current_snapshot = next(
+        (s for s in snapshots if s.snapshot_id == metadata.current_snapshot_id), None
+    )
     if current_snapshot:
         timestamp = datetime.fromtimestamp(current_snapshot.timestamp_ms / 1000)
         print(f"Current snapshot: {current_snapshot.snapshot_id}")
@@ -64,7 +71,6 @@ def show_table_stats(table, title="TABLE STATISTICS"):
             pass
 
     # Count snapshots
-    snapshots = list(table.snapshots())
     print(f"Total snapshots: {len(snapshots)}")
 
 def generate_incremental_data():
@@ -73,123 +79,114 @@ def generate_incremental_data():
     print("GENERATING INCREMENTAL DATA")
     print("="*50)
 
-    if not os.path.exists("logs/access_log_day3.csv"):
+    # Stream the CSV directly into Arrow with the target column types
+    read_options = pacsv.ReadOptions(use_threads=True, block_size=16 << 20)
+    convert_options = pacsv.ConvertOptions(
+        column_types={field.name: field.type for field in LOG_SCHEMA},
+        strings_can_be_null=True,
+        timestamp_parsers=[LOG_TIMESTAMP_FORMAT, pacsv.ISO8601],
+    )
+    try:
+        reader = pacsv.open_csv(
+            "logs/access_log_day3.csv", read_options=read_options, convert_options=convert_options
+        )
+    except FileNotFoundError:
         print("❌ logs/access_log_day3.csv not found. Please generate it first.")
         return None
 
-    df = pd.read_csv("logs/access_log_day3.csv")
-    print(f"📁 Loaded {len(df)} records from day 3")
+    # Collect the batches without copying them into one contiguous table
+    with reader:
+        arrow_table = pa.Table.from_batches(list(reader), schema=reader.schema)
+    num_rows = arrow_table.num_rows
+    print(f"📁 Loaded {num_rows} records from day 3")
 
     # Add enhanced fields (like we did for day 2)
     countries = ['US', 'CA', 'UK', 'DE', 'FR', 'JP', 'AU', 'BR']
     browsers = ['Chrome', 'Safari', 'Firefox', 'Edge', 'Chrome Mobile']
 
-    df['user_country'] = [random.choice(countries) for _ in range(len(df))]
-    df['browser'] = [random.choice(browsers) for _ in range(len(df))]
-    df['is_mobile'] = df.apply(lambda row:
-        'Mobile' in str(row['user_agent']) or row['browser'] == 'Chrome Mobile', axis=1)
+    # Low-cardinality columns are built as dictionary arrays: int8 codes
+    # index into the value list instead of materializing a string per row
+    country_codes = _RNG.integers(0, len(countries), size=num_rows, dtype=np.int8)
+    user_country = pa.DictionaryArray.from_arrays(country_codes, countries)
+    browser_codes = _RNG.integers(0, len(browsers), size=num_rows, dtype=np.int8)
+    browser = pa.DictionaryArray.from_arrays(browser_codes, browsers)
+
+    # Missing user agents count as not mobile
+    mobile_agent = pc.fill_null(pc.match_substring(arrow_table['user_agent'], 'Mobile'), False)
+    is_mobile = pc.or_(mobile_agent, pc.equal(browser, 'Chrome Mobile'))
+
+    arrow_table = (arrow_table
+                   .append_column('user_country', user_country)
+                   .append_column('browser', browser)
+                   .append_column('is_mobile', is_mobile))
 
     print("✅ Enhanced day 3 data with new fields")
-    return df
+    return arrow_table
 
-def simple_append(table, df):
-    """Strategy 1: Simple append (most common)"""
+def simple_append(arrow_table):
+    """Strategy 1: Simple append (most common) - prepare the new day's batch"""
     print("\n📈 Strategy 1: Simple Append")
     print("-" * 30)
 
-    # Prepare data
-    df_copy = df.copy()
-    df_copy['timestamp'] = pd.to_datetime(df_copy['timestamp'])
-    df_copy['status_code'] = df_copy['status_code'].astype('int32')
-    df_copy['response_size'] = df_copy['response_size'].astype('int64')
-    df_copy['is_mobile'] = df_copy['is_mobile'].astype('bool')
-
-    # Create PyArrow table
-    schema = pa.schema([
-        pa.field('timestamp', pa.timestamp('us'), nullable=False),
-        pa.field('ip_address', pa.string(), nullable=False),
-        pa.field('method', pa.string(), nullable=False),
-        pa.field('url', pa.string(), nullable=False),
-        pa.field('status_code', pa.int32(), nullable=False),
-        pa.field('response_size', pa.int64(), nullable=False),
-        pa.field('user_agent', pa.string(), nullable=True),
-        pa.field('user_country', pa.string(), nullable=True),
-        pa.field('browser', pa.string(), nullable=True),
-        pa.field('is_mobile', pa.bool_(), nullable=True),
-    ])
-
-    arrow_table = pa.Table.from_pandas(df_copy, schema=schema)
-
-    # Append to table
-    print(f"Appending {len(df_copy)} records...")
-    table.append(arrow_table)
-
-    print("✅ Simple append complete")
-    return table
+    # Columns are already typed by the CSV reader, so this applies the
+    # table's nullability and decodes the generated dictionary columns
+    # (Iceberg has no dictionary type; Parquet dictionary-encodes them on write)
+    arrow_table = arrow_table.cast(LOG_SCHEMA)
+
+    print(f"Prepared {arrow_table.num_rows} records to append")
+    return arrow_table
 
-def simulate_late_arriving_data(table):
-    """Strategy 2: Handle late-arriving data (data that arrives out of order)"""
+def simulate_late_arriving_data(num_records=50):
+    """Strategy 2: Handle late-arriving data (data that arrives out of order)
+
+    Every column is built as a whole NumPy array, so num_records can be
+    raised to millions of rows for load testing.
+    """
     print("\n⏰ Strategy 2: Late-Arriving Data")
     print("-" * 35)
 
     # Simulate some records from day 1 that arrived late
     print("Simulating late-arriving data from day 1...")
 
-    # Create some "late" records with day 1 timestamps
-    late_records = []
-    base_date = datetime(2024, 1, 1)
-
-    for i in range(50):  # Small batch of late data
-        timestamp = base_date + timedelta(
-            hours=random.randint(0, 23),
-            minutes=random.randint(0, 59),
-            seconds=random.randint(0, 59)
-        )
-
-        record = {
-            'timestamp': timestamp,
-            'ip_address': '192.168.1.200',  # Different IP to identify late data
-            'method': random.choice(['GET', 'POST']),
-            'url': '/api/late-data',
-            'status_code': 200,
-            'response_size': random.randint(1000, 5000),
-            'user_agent': 'Late-Arriving-Agent/1.0',
-            'user_country': 'US',
-            'browser': 'Chrome',
-            'is_mobile': False
-        }
-        late_records.append(record)
-
-    # Convert to DataFrame and then Arrow
-    late_df = pd.DataFrame(late_records)
-    late_df['timestamp'] = pd.to_datetime(late_df['timestamp'])
-    late_df['status_code'] = late_df['status_code'].astype('int32')
-    late_df['response_size'] = late_df['response_size'].astype('int64')
-    late_df['is_mobile'] = late_df['is_mobile'].astype('bool')
-
-    schema = pa.schema([
-        pa.field('timestamp', pa.timestamp('us'), nullable=False),
-        pa.field('ip_address', pa.string(), nullable=False),
-        pa.field('method', pa.string(), nullable=False),
-        pa.field('url', pa.string(), nullable=False),
-        pa.field('status_code', pa.int32(), nullable=False),
-        pa.field('response_size', pa.int64(), nullable=False),
-        pa.field('user_agent', pa.string(), nullable=True),
-        pa.field('user_country', pa.string(), nullable=True),
-        pa.field('browser', pa.string(), nullable=True),
-        pa.field('is_mobile', pa.bool_(), nullable=True),
-    ])
-
-    late_arrow = pa.Table.from_pandas(late_df, schema=schema)
-
-    print(f"Appending {len(late_df)} late-arriving records...")
-    table.append(late_arrow)
-
-    print("✅ Late-arriving data processed")
+    # Create some "late" records with day 1 timestamps, one array per column.
+    # Constant columns are filled directly in Arrow with pa.repeat
+    base_date = np.datetime64('2024-01-01', 'us')
+    offsets = _RNG.integers(0, 24 * 3600, size=num_records).astype('timedelta64[s]')
+
+    late_arrow = pa.Table.from_arrays([
+        pa.array(base_date + offsets, type=pa.timestamp('us')),
+        pa.repeat('192.168.1.200', num_records),  # Different IP to identify late data
+        pa.DictionaryArray.from_arrays(
+            _RNG.integers(0, 2, size=num_records, dtype=np.int8), ['GET', 'POST']
+        ),
+        pa.repeat('/api/late-data', num_records),
+        pa.repeat(pa.scalar(200, pa.int32()), num_records),
+        pa.array(_RNG.integers(1000, 5001, size=num_records, dtype=np.int64)),
+        pa.repeat('Late-Arriving-Agent/1.0', num_records),
+        pa.repeat('US', num_records),
+        pa.repeat('Chrome', num_records),
+        pa.repeat(False, num_records),
+    ], names=LOG_SCHEMA.names).cast(LOG_SCHEMA)  # Decodes the method dictionary
+
+    print(f"Prepared {late_arrow.num_rows} late-arriving records to append")
     print("   - Data from day 1 added to table on day 3")
     print("   - Time-based queries will find this data in the correct time range")
     print("   - No need to rebuild or reorganize existing data")
 
+    return late_arrow
+
+def append_batches(table, batches):
+    """Commit several prepared batches with a single append (one snapshot)"""
+    print("\n💾 Appending all batches in one commit")
+    print("-" * 35)
+
+    # One append = one manifest list, one metadata.json and one catalog
+    # update, instead of paying that overhead once per batch
+    combined = pa.concat_tables(batches)
+    print(f"Appending {combined.num_rows} records from {len(batches)} batches...")
+    table.append(combined)
+
+    print("✅ Incremental append complete")
     return table
 
 def demonstrate_filtering_reads(table):
@@ -206,22 +203,34 @@ def demonstrate_filtering_reads(table):
         day1_start = datetime(2024, 1, 1)
         day1_end = datetime(2024, 1, 2)
 
-        # Convert to milliseconds (Iceberg timestamp format)
-        start_ms = int(day1_start.timestamp() * 1000)
-        end_ms = int(day1_end.timestamp() * 1000)
-
-        # Create filter expression
+        # Create filter expression; datetime literals bind as microsecond
+        # timestamps, matching the file statistics used to skip files.
+        # Filters name table columns, not partition fields: PyIceberg projects
+        # this range onto the day(timestamp) partition when planning the scan
         time_filter = And(
-            GreaterThanOrEqual("timestamp", start_ms),
-            LessThan("timestamp", end_ms)
+            GreaterThanOrEqual("timestamp", day1_start),
+            LessThan("timestamp", day1_end)
         )
 
-        # Scan with filter
-        filtered_scan = table.scan(row_filter=time_filter)
+        # Scan with filter, decoding only the column the count needs
+        filtered_scan = table.scan(row_filter=time_filter, selected_fields=("timestamp",))
         filtered_data = filtered_scan.to_arrow()
 
-        print(f"   - Total records in table: {table.scan().to_arrow().num_rows}")
+        # The snapshot summary already tracks the row count - no scan needed
+        total_records = int(table.current_snapshot().summary.get('total-records', 0))
+
+        # The table is partitioned by day, so planning keeps only day 1's files
+        total_files = len(table.scan().plan_files())
+        day1_tasks = filtered_scan.plan_files()
+        day1_files = len(day1_tasks)
+        # Day partition values are stored as days since the Unix epoch
+        partitions = sorted({date(1970, 1, 1) + timedelta(days=task.file.partition[0])
+                             for task in day1_tasks})
+
+        print(f"   - Total records in table: {total_records}")
         print(f"   - Day 1 records (filtered): {filtered_data.num_rows}")
+        print(f"   - Data files scanned: {day1_files} of {total_files}")
+        print(f"   - Partitions scanned: {', '.join(str(day) for day in partitions)}")
         print("   - Iceberg only read files containing day 1 data!")
 
     except Exception as e:
@@ -239,51 +248,49 @@ def demonstrate_filtering_reads(table):
     except Exception as e:
         print(f"   Value filter demo: {e}")
 
-def analyze_incremental_patterns(table):
+def analyze_incremental_patterns(conn, table):
     """Analyze the incremental loading patterns"""
     print("\n" + "="*50)
     print("INCREMENTAL LOADING ANALYSIS")
     print("="*50)
 
-    conn = duckdb.connect()
-
     try:
-        conn.execute("INSTALL iceberg")
-        conn.execute("LOAD iceberg")
+        if conn is None:
+            raise RuntimeError("DuckDB is not installed")
+
+        load_iceberg_extension(conn)
         conn.execute("SET unsafe_enable_version_guessing = true")
 
+        # OR REPLACE keeps this safe to call again on the same connection
         table_location = table.location()
-        conn.execute(f"CREATE VIEW logs AS SELECT * FROM iceberg_scan('{table_location}')")
+        conn.execute(f"CREATE OR REPLACE VIEW logs AS SELECT * FROM iceberg_scan('{table_location}')")
 
-        # Analyze data distribution by day
+        # Per-day stats and the late-arriving count in one pass over the data;
+        # ROLLUP adds a final row (date = NULL) with the table-wide totals
         result = conn.execute("""
             SELECT
                 DATE(timestamp) as date,
                 COUNT(*) as records,
                 COUNT(DISTINCT ip_address) as unique_ips,
-                AVG(response_size) as avg_response_size
+                AVG(response_size) as avg_response_size,
+                SUM(CASE WHEN ip_address = '192.168.1.200' THEN 1 ELSE 0 END) as late_records
             FROM logs
-            GROUP BY DATE(timestamp)
-            ORDER BY date
+            GROUP BY ROLLUP(DATE(timestamp))
+            ORDER BY date NULLS LAST
         """).fetchdf()
 
+        by_day = result.iloc[:-1]
+        totals = result.iloc[-1]
+
         print("📊 Data by day:")
-        print(result.to_string(index=False))
+        print(by_day.drop(columns='late_records').to_string(index=False))
 
         # Show late-arriving data
-        late_data_result = conn.execute("""
-            SELECT COUNT(*) as late_records
-            FROM logs
-            WHERE ip_address = '192.168.1.200'
-        """).fetchdf()
-
         print(f"\n📊 Late-arriving data:")
-        print(f"Records with IP 192.168.1.200 (late data): {late_data_result['late_records'].iloc[0]}")
+        print(f"Records with IP 192.168.1.200 (late data): {int(totals['late_records'])}")
 
     except Exception as e:
         print(f"Analysis failed: {e}")
-    finally:
-        conn.close()
 
 def show_incremental_best_practices():
     """Show best practices for incremental loading"""
@@ -332,30 +339,33 @@ def main():
     show_table_stats(table, "BEFORE INCREMENTAL UPDATES")
 
     # Generate incremental data
-    incremental_df = generate_incremental_data()
-    if incremental_df is None:
+    incremental_data = generate_incremental_data()
+    if incremental_data is None:
         print("Cannot continue without day 3 data.")
         return
 
     # Strategy 1: Simple append
-    table = simple_append(table, incremental_df)
-
-    # Refresh table to see changes
-    table = catalog.load_table("web_logs.access_logs")
-    show_table_stats(table, "AFTER SIMPLE APPEND")
+    new_data = simple_append(incremental_data)
 
     # Strategy 2: Late-arriving data
-    table = simulate_late_arriving_data(table)
+    late_data = simulate_late_arriving_data()
 
-    # Refresh again
-    table = catalog.load_table("web_logs.access_logs")
-    show_table_stats(table, "AFTER LATE-ARRIVING DATA")
+    # Commit both batches together
+    table = append_batches(table, [new_data, late_data])
+
+    # No reload needed: the append refreshes the table object in place
+    show_table_stats(table, "AFTER INCREMENTAL APPEND")
 
     # Strategy 3: Demonstrate filtering
     demonstrate_filtering_reads(table)
 
-    # Analysis
-    analyze_incremental_patterns(table)
+    # Analysis with a single DuckDB connection
+    conn = connect_duckdb()
+    try:
+        analyze_incremental_patterns(conn, table)
+    finally:
+        if conn is not None:
+            conn.close()
 
     # Best practices
     show_incremental_best_practices()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Catalog settings shared by the tutorial steps
+
+The step scripts import this module (it sits next to them in src/) so the
+warehouse location, the .pyiceberg.yaml contents and the SQLite tuning are
+defined in one place, and every step opens the catalog the same way.
+"""
+
+import os
+
+from pyiceberg.catalog.sql import SqlCatalog
+from sqlalchemy import event
+
+# Resolved once at import time (using data/warehouse for better organization)
+WAREHOUSE_PATH = os.path.abspath("data/warehouse")
+CATALOG_URI = f"sqlite:///{WAREHOUSE_PATH}/pyiceberg_catalog.db"
+CATALOG_CONFIG = f"""catalog:
+  default:
+    type: sql
+    uri: {CATALOG_URI}
+    warehouse: file://{WAREHOUSE_PATH}
+"""
+
+
+def write_catalog_config():
+    """Write .pyiceberg.yaml only if it is missing or out of date"""
+    if os.path.exists(".pyiceberg.yaml"):
+        with open(".pyiceberg.yaml") as f:
+            if f.read() == CATALOG_CONFIG:
+                return False
+
+    # Write a temp file and rename it over the old one, so a reader never
+    # sees a half-written config
+    with open(".pyiceberg.yaml.tmp", "w") as f:
+        f.write(CATALOG_CONFIG)
+    os.replace(".pyiceberg.yaml.tmp", ".pyiceberg.yaml")
+    return True
+
+def tune_catalog_db(catalog):
+    """Use faster SQLite settings for the local catalog database
+
+    WAL journaling with synchronous=NORMAL avoids an fsync on every catalog
+    commit, which is plenty of durability for a development catalog.
+    """
+    @event.listens_for(catalog.engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.close()
+
+    # Drop connections opened during catalog setup so new ones get the pragmas
+    catalog.engine.dispose()
+    return catalog
+
+def get_catalog():
+    """Open the tutorial's SQLite-backed catalog with tuned settings"""
+    os.makedirs(WAREHOUSE_PATH, exist_ok=True)
+
+    # Keep .pyiceberg.yaml in place for tools that discover the catalog
+    # through it (the DuckDB examples, the PyIceberg CLI)
+    os.environ['PYICEBERG_HOME'] = os.getcwd()
+    if write_catalog_config():
+        print("ℹ️  Created .pyiceberg.yaml config file")
+
+    # Instantiate the SQL catalog directly instead of going through
+    # load_catalog's config discovery
+    catalog = SqlCatalog(
+        "default",
+        uri=CATALOG_URI,
+        warehouse=f"file://{WAREHOUSE_PATH}",
+    )
+    return tune_catalog_db(catalog)
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Small helpers shared by the tutorial steps
+
+Like catalog_config.py, this module sits next to the step scripts in src/
+so each step imports it instead of carrying its own copy.
+"""
+
+import pyarrow.compute as pc
+
+# Timestamp layout written by generate_logs.py
+LOG_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def count_values(column):
+    """Count occurrences of each value in an Arrow column, most common first"""
+    counts = pc.value_counts(column).to_pylist()
+    counts.sort(key=lambda item: item['counts'], reverse=True)
+    return {item['values']: item['counts'] for item in counts}
+
+def connect_duckdb():
+    """Open a DuckDB connection, or return None if DuckDB isn't installed"""
+    try:
+        import duckdb  # Imported here: only the query steps need it
+    except ImportError:
+        return None
+    return duckdb.connect()
+
+def load_iceberg_extension(conn):
+    """Load DuckDB's iceberg extension, installing it only when missing"""
+    installed = conn.execute(
+        "SELECT installed FROM duckdb_extensions() WHERE extension_name = 'iceberg'"
+    ).fetchone()
+    if not (installed and installed[0]):
+        conn.execute("INSTALL iceberg")
+    conn.execute("LOAD iceberg")
@@ -1,13 +1,14 @@
 import os
-import random
-from datetime import datetime, timedelta
+from datetime import datetime
 
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
 
 
-def generate_sample_logs(day, num_records=1000):
-    """Generate sample web server logs for a given day"""
+def generate_sample_logs(days, num_records=1000):
+    """Generate sample web server logs for days 1..days, num_records per day"""
 
     # Sample data for realistic logs
     ips = ['192.168.1.100', '10.0.0.50', '203.0.113.10', '198.51.100.25', '172.16.0.10']
@@ -20,37 +21,50 @@ def generate_sample_logs(day, num_records=1000):
     ]
     status_codes = [200, 200, 200, 200, 404, 500, 201, 204]  # Weighted toward 200
 
-    base_date = datetime(2024, 1, 1) + timedelta(days=day-1)
-
-    logs = []
-    for i in range(num_records):
-        timestamp = base_date + timedelta(
-            hours=random.randint(0, 23),
-            minutes=random.randint(0, 59),
-            seconds=random.randint(0, 59)
-        )
-
-        log_entry = {
-            'timestamp': timestamp,
-            'ip_address': random.choice(ips),
-            'method': random.choice(methods),
-            'url': random.choice(urls),
-            'status_code': random.choice(status_codes),
-            'response_size': random.randint(100, 50000),
-            'user_agent': random.choice(user_agents)
-        }
-        logs.append(log_entry)
-
-    df = pd.DataFrame(logs)
+    base_date = datetime(2024, 1, 1)
+
+    # Draw each column for all days' records at once
+    rng = np.random.default_rng()
+    day = np.repeat(np.arange(1, days + 1), num_records)
+    total = len(day)
+    seconds_of_day = rng.integers(0, 24 * 3600, size=total)
+
+    def categorical(values):
+        # Low-cardinality strings as random codes into the value list
+        # (a pandas categorical becomes an Arrow dictionary array)
+        return pd.Categorical.from_codes(rng.integers(0, len(values), size=total), values)
+
+    df = pd.DataFrame({
+        'timestamp': (base_date + pd.to_timedelta(day - 1, unit='D')
+                      + pd.to_timedelta(seconds_of_day, unit='s')),
+        'ip_address': categorical(ips),
+        'method': categorical(methods),
+        'url': categorical(urls),
+        'status_code': rng.choice(status_codes, size=total),
+        'response_size': rng.integers(100, 50001, size=total),
+        'user_agent': categorical(user_agents),
+        'day': day,
+    })
     df = df.sort_values('timestamp')
     return df
 
-# Generate sample data for 3 days
+def write_logs_csv(df, path):
+    """Write logs to CSV with Arrow's multithreaded C++ writer"""
+    arrow_table = pa.Table.from_pandas(df, preserve_index=False)
+    # Whole-second timestamps keep the "YYYY-MM-DD HH:MM:SS" layout the loaders parse
+    arrow_table = arrow_table.set_column(
+        0, 'timestamp', arrow_table['timestamp'].cast(pa.timestamp('s'))
+    )
+
+    # Default quoting, so values with commas (many real user agents) stay intact
+    pacsv.write_csv(arrow_table, path)
+
+# Generate sample data for 3 days in one pass, then write one CSV per day
 os.makedirs('logs', exist_ok=True)
 
-for day in range(1, 4):
-    df = generate_sample_logs(day, 1000)
-    df.to_csv(f'logs/access_log_day{day}.csv', index=False)
+logs = generate_sample_logs(3, 1000)
+for day, df in logs.groupby('day'):
+    write_logs_csv(df.drop(columns='day'), f'logs/access_log_day{day}.csv')
     print(f"Generated access_log_day{day}.csv with {len(df)} records")
 
 print("Sample data generation complete!")
\ No newline at end of file
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Run the first tutorial steps in a single process
+
+Each step script still runs on its own. This driver imports steps 1-3 and
+hands them one shared catalog, so the SQLite catalog database and its
+configuration are opened once instead of once per script.
+
+Usage:
+    uv run src/run_pipeline.py          # steps 1, 2 and 3
+    uv run src/run_pipeline.py 2 3      # only the listed steps
+"""
+
+import importlib.util
+import os
+import sys
+
+STEP_SCRIPTS = {
+    1: "01_create_table.py",
+    2: "02_initial_load.py",
+    3: "03_schema_evolution.py",
+}
+
+
+class Pipeline:
+    """Run tutorial steps against one long-lived catalog"""
+
+    def __init__(self):
+        self.catalog = None
+        self._modules = {}
+
+    def load_step(self, step):
+        """Import a step script (file names start with digits, so use importlib)"""
+        if step not in self._modules:
+            path = os.path.join(os.path.dirname(os.path.abspath(__file__)), STEP_SCRIPTS[step])
+            spec = importlib.util.spec_from_file_location(f"step_{step}", path)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            self._modules[step] = module
+        return self._modules[step]
+
+    def run_step(self, step):
+        """Run one step, creating the shared catalog on first use"""
+        if self.catalog is None:
+            # Step 1's setup also creates the warehouse directory if needed
+            step1 = self.load_step(1)
+            self.catalog = step1.setup_catalog()
+
+        print(f"\n{'#' * 50}")
+        print(f"# STEP {step}: {STEP_SCRIPTS[step]}")
+        print(f"{'#' * 50}\n")
+        self.load_step(step).main(catalog=self.catalog)
+
+
+def main():
+    """Main execution flow"""
+    try:
+        steps = [int(arg) for arg in sys.argv[1:]] or sorted(STEP_SCRIPTS)
+    except ValueError:
+        steps = []
+    if not steps or any(step not in STEP_SCRIPTS for step in steps):
+        print(f"Usage: {sys.argv[0]} [STEP ...]  (steps: {sorted(STEP_SCRIPTS)})")
+        return
+
+    pipeline = Pipeline()
+    for step in steps:
+        pipeline.run_step(step)
+
+
+if __name__ == "__main__":
+    main()
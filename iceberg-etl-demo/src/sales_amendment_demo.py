@@ -8,36 +8,43 @@ Demonstrates different patterns for handling changes to historical data:
 3. Delete + Insert Pattern (for complex changes)
 """
 
-import os
 from datetime import datetime, timedelta
 
-import duckdb
-import pandas as pd
 import pyarrow as pa
-from pyiceberg.catalog import load_catalog
+import pyarrow.compute as pc
+from pyiceberg.expressions import And, EqualTo
+from pyiceberg.partitioning import PartitionField, PartitionSpec
 from pyiceberg.schema import Schema
+from pyiceberg.transforms import IdentityTransform
 from pyiceberg.types import (BooleanType, IntegerType, LongType, NestedField,
                              StringType, TimestampType)
 
+from catalog_config import WAREHOUSE_PATH, get_catalog
+from demo_helpers import connect_duckdb, load_iceberg_extension
+
+# Arrow schema matching the sales.orders Iceberg table
+SALES_SCHEMA = pa.schema([
+    pa.field('order_id', pa.string(), nullable=False),
+    pa.field('customer_id', pa.string(), nullable=False),
+    pa.field('amount', pa.int64(), nullable=False),
+    pa.field('order_date', pa.timestamp('us'), nullable=False),
+    pa.field('status', pa.string(), nullable=False),
+    pa.field('record_version', pa.int32(), nullable=False),
+    pa.field('created_at', pa.timestamp('us'), nullable=False),
+    pa.field('is_current', pa.bool_(), nullable=False),
+    pa.field('change_reason', pa.string(), nullable=True),
+])
+
+# Rows per Arrow record batch handed to Iceberg appends; batches this size
+# stay cache-friendly and let large inputs be split into bounded chunks
+ARROW_BATCH_ROWS = 8192
+
 
 def create_sales_table_example():
     """Create a sample sales table to demonstrate amendments"""
 
     # Get catalog
-    warehouse_path = os.path.abspath("data/warehouse")
-    os.environ['PYICEBERG_HOME'] = os.getcwd()
-
-    if not os.path.exists(".pyiceberg.yaml"):
-        config_content = f"""catalog:
-  default:
-    type: sql
-    uri: sqlite:///{warehouse_path}/pyiceberg_catalog.db
-    warehouse: file://{warehouse_path}
-"""
-        with open(".pyiceberg.yaml", "w") as f:
-            f.write(config_content)
-
-    catalog = load_catalog("default")
+    catalog = get_catalog()
 
     # Create namespace if needed
     try:
@@ -58,12 +65,23 @@ def create_sales_table_example():
         NestedField(field_id=9, name="change_reason", field_type=StringType(), required=False),
     )
 
+    # Partition on is_current (field 8) so the business view, which only reads
+    # current records, can skip the files holding superseded versions
+    partition_spec = PartitionSpec(
+        PartitionField(source_id=8, field_id=1000, transform=IdentityTransform(), name="is_current_p")
+    )
+
     # Create table
     try:
         table = catalog.create_table(
             identifier="sales.orders",
             schema=schema,
-            location=f"file://{warehouse_path}/sales/orders"
+            partition_spec=partition_spec,
+            # Keep exact per-file min/max bounds for every column (the default
+            # truncates strings), so filters such as order_id = 'ORD-001'
+            # can skip data files from the manifests alone
+            properties={"write.metadata.metrics.default": "full"},
+            location=f"file://{WAREHOUSE_PATH}/sales/orders"
         )
         print("✅ Created sales.orders table")
     except:
@@ -77,64 +95,45 @@ def load_initial_sales_data(table):
     print("\n📊 Loading Initial Sales Data")
     print("-" * 30)
 
-    # Sample sales data
-    initial_orders = [
-        {
-            'order_id': 'ORD-001',
-            'customer_id': 'CUST-123',
-            'amount': 10000,  # $100.00 in cents
-            'order_date': datetime(2024, 1, 15, 10, 30),
-            'status': 'completed',
-            'record_version': 1,
-            'created_at': datetime(2024, 1, 15, 10, 30),
-            'is_current': True,
-            'change_reason': None
-        },
-        {
-            'order_id': 'ORD-002',
-            'customer_id': 'CUST-456',
-            'amount': 25000,  # $250.00
-            'order_date': datetime(2024, 1, 16, 14, 15),
-            'status': 'completed',
-            'record_version': 1,
-            'created_at': datetime(2024, 1, 16, 14, 15),
-            'is_current': True,
-            'change_reason': None
-        },
-        {
-            'order_id': 'ORD-003',
-            'customer_id': 'CUST-789',
-            'amount': 5000,   # $50.00
-            'order_date': datetime(2024, 1, 17, 9, 45),
-            'status': 'completed',
-            'record_version': 1,
-            'created_at': datetime(2024, 1, 17, 9, 45),
-            'is_current': True,
-            'change_reason': None
-        }
-    ]
-
-    df = pd.DataFrame(initial_orders)
-
-    # Convert to Arrow with proper types
-    schema = pa.schema([
-        pa.field('order_id', pa.string(), nullable=False),
-        pa.field('customer_id', pa.string(), nullable=False),
-        pa.field('amount', pa.int64(), nullable=False),
-        pa.field('order_date', pa.timestamp('us'), nullable=False),
-        pa.field('status', pa.string(), nullable=False),
-        pa.field('record_version', pa.int32(), nullable=False),
-        pa.field('created_at', pa.timestamp('us'), nullable=False),
-        pa.field('is_current', pa.bool_(), nullable=False),
-        pa.field('change_reason', pa.string(), nullable=True),
-    ])
-
-    arrow_table = pa.Table.from_pandas(df, schema=schema)
-    table.append(arrow_table)
-
-    print(f"✅ Loaded {len(df)} initial orders")
+    # Sample sales data, one list per column. The order dates are converted
+    # to an Arrow timestamp array once and shared by order_date and created_at
+    order_dates = pa.array([
+        datetime(2024, 1, 15, 10, 30),
+        datetime(2024, 1, 16, 14, 15),
+        datetime(2024, 1, 17, 9, 45),
+    ], type=pa.timestamp('us'))
+    initial_orders = {
+        'order_id': ['ORD-001', 'ORD-002', 'ORD-003'],
+        'customer_id': ['CUST-123', 'CUST-456', 'CUST-789'],
+        'amount': [10000, 25000, 5000],  # $100.00, $250.00, $50.00 in cents
+        'order_date': order_dates,
+        'status': ['completed'] * 3,
+        'record_version': [1] * 3,
+        'created_at': order_dates,
+        'is_current': [True] * 3,
+        'change_reason': [None] * 3,
+    }
+
+    # Each column list converts straight to an Arrow array of the field's type
+    arrow_table = pa.Table.from_pydict(initial_orders, schema=SALES_SCHEMA)
+    table.append(rebatch(arrow_table))
+
+    print(f"✅ Loaded {arrow_table.num_rows} initial orders")
     return table
 
+def rebatch(arrow_table):
+    """Re-chunk arrow_table into ARROW_BATCH_ROWS-row batches for writing"""
+    batches = arrow_table.to_batches(max_chunksize=ARROW_BATCH_ROWS)
+    return pa.Table.from_batches(batches, schema=arrow_table.schema)
+
+def with_columns(arrow_table, **columns):
+    """Return arrow_table with the named columns replaced by new values"""
+    for name, values in columns.items():
+        field = SALES_SCHEMA.field(name)
+        index = arrow_table.schema.get_field_index(name)
+        arrow_table = arrow_table.set_column(index, field, values.cast(field.type))
+    return arrow_table
+
 def process_sales_amendment(table):
     """Process an amendment to existing sales data"""
     print("\n🔄 Processing Sales Amendment")
@@ -144,51 +143,37 @@ def process_sales_amendment(table):
     print("Original: $100.00 → Amendment: $120.00")
     print("Reason: Customer applied discount code after initial processing")
 
-    # Step 1: Mark old record as not current
-    amendment_records = [
-        # Original record marked as superseded
-        {
-            'order_id': 'ORD-001',
-            'customer_id': 'CUST-123',
-            'amount': 10000,  # Original amount
-            'order_date': datetime(2024, 1, 15, 10, 30),
-            'status': 'completed',
-            'record_version': 1,
-            'created_at': datetime(2024, 1, 15, 10, 30),
-            'is_current': False,  # 🔄 Changed to False
-            'change_reason': 'Superseded by amendment'
-        },
-        # New record with corrected amount
-        {
-            'order_id': 'ORD-001',
-            'customer_id': 'CUST-123',
-            'amount': 12000,  # $120.00 - corrected amount
-            'order_date': datetime(2024, 1, 15, 10, 30),  # Same original date
-            'status': 'completed',
-            'record_version': 2,  # 🔄 Incremented version
-            'created_at': datetime(2024, 1, 20, 16, 45),  # When amendment was processed
-            'is_current': True,
-            'change_reason': 'Amount correction - discount applied'
-        }
-    ]
-
-    df = pd.DataFrame(amendment_records)
-
-    # Convert to Arrow
-    schema = pa.schema([
-        pa.field('order_id', pa.string(), nullable=False),
-        pa.field('customer_id', pa.string(), nullable=False),
-        pa.field('amount', pa.int64(), nullable=False),
-        pa.field('order_date', pa.timestamp('us'), nullable=False),
-        pa.field('status', pa.string(), nullable=False),
-        pa.field('record_version', pa.int32(), nullable=False),
-        pa.field('created_at', pa.timestamp('us'), nullable=False),
-        pa.field('is_current', pa.bool_(), nullable=False),
-        pa.field('change_reason', pa.string(), nullable=True),
-    ])
-
-    arrow_table = pa.Table.from_pandas(df, schema=schema)
-    table.append(arrow_table)
+    # Read the current version of the order back from the table
+    current_filter = And(EqualTo('order_id', 'ORD-001'), EqualTo('is_current', True))
+    current = table.scan(row_filter=current_filter).to_arrow()
+    if current.num_rows == 0:
+        print("❌ No current record for ORD-001 to amend")
+        return table
+    n = current.num_rows
+
+    # Original record marked as superseded (is_current changed to False)
+    superseded = with_columns(
+        current,
+        is_current=pa.repeat(False, n),
+        change_reason=pa.repeat('Superseded by amendment', n),
+    )
+
+    # New record with corrected amount and incremented version
+    amended_at = pa.scalar(datetime(2024, 1, 20, 16, 45), pa.timestamp('us'))  # When amendment was processed
+    new_version = with_columns(
+        current,
+        amount=pa.repeat(12000, n),  # $120.00 - corrected amount
+        record_version=pc.add(current['record_version'], 1),
+        created_at=pa.repeat(amended_at, n),
+        is_current=pa.repeat(True, n),
+        change_reason=pa.repeat('Amount correction - discount applied', n),
+    )
+
+    # One commit: replace the current rows with their superseded copies (so
+    # no stale is_current=True row is left behind), then add the new version
+    with table.transaction() as txn:
+        txn.overwrite(rebatch(superseded), overwrite_filter=current_filter)
+        txn.append(rebatch(new_version))
 
     print("✅ Amendment processed")
     print("   - Original record marked as is_current=False")
@@ -197,33 +182,44 @@ def process_sales_amendment(table):
 
     return table
 
-def query_sales_with_amendments(table):
+def print_rows(columns, rows):
+    """Print query results as right-aligned text columns"""
+    cells = [[str(value) for value in row] for row in rows]
+    widths = [max(len(cell) for cell in column) for column in zip(columns, *cells)]
+    for line in [columns, *cells]:
+        print("  ".join(cell.rjust(width) for cell, width in zip(line, widths)))
+
+def query_sales_with_amendments(conn, table_location, order_id='ORD-001'):
     """Query sales data handling amendments correctly"""
     print("\n" + "="*50)
     print("QUERYING SALES DATA WITH AMENDMENTS")
     print("="*50)
 
-    conn = duckdb.connect()
-
     try:
-        conn.execute("INSTALL iceberg")
-        conn.execute("LOAD iceberg")
+        if conn is None:
+            raise RuntimeError("DuckDB is not installed")
+
+        load_iceberg_extension(conn)
         conn.execute("SET unsafe_enable_version_guessing = true")
 
-        table_location = table.location()
-        conn.execute(f"CREATE VIEW sales AS SELECT * FROM iceberg_scan('{table_location}')")
+        # Scan the Iceberg table once into a temp table that all the queries
+        # below share (a view would rescan manifests and files per query);
+        # OR REPLACE keeps this safe to call again on the same connection
+        conn.execute(f"CREATE OR REPLACE TEMP TABLE sales AS SELECT * FROM iceberg_scan('{table_location}')")
 
+        # (title, SQL, parameters): the audit trail binds order_id as a ?
+        # parameter, so the SQL text stays fixed for whichever order is traced
         queries = [
-            ("All records (including superseded)", "SELECT * FROM sales ORDER BY order_id, record_version"),
+            ("All records (including superseded)", "SELECT * FROM sales ORDER BY order_id, record_version", None),
 
             ("Current state (business view)", """
              SELECT order_id, customer_id, amount/100.0 as amount_dollars, order_date, status
              FROM sales
              WHERE is_current = true
              ORDER BY order_id
-             """),
+             """, None),
 
-            ("Audit trail for ORD-001", """
+            (f"Audit trail for {order_id}", """
              SELECT
                  order_id,
                  amount/100.0 as amount_dollars,
@@ -232,9 +228,9 @@ def query_sales_with_amendments(table):
                  is_current,
                  change_reason
              FROM sales
-             WHERE order_id = 'ORD-001'
+             WHERE order_id = ?
              ORDER BY record_version
-             """),
+             """, [order_id]),
 
             ("Total sales (current values only)", """
              SELECT
@@ -243,29 +239,28 @@ def query_sales_with_amendments(table):
                  AVG(amount)/100.0 as avg_order_dollars
              FROM sales
              WHERE is_current = true
-             """),
+             """, None),
 
             ("Amendment history", """
              SELECT
                  COUNT(*) as total_amendments
              FROM sales
              WHERE record_version > 1
-             """)
+             """, None)
         ]
 
-        for title, query in queries:
+        for title, query, params in queries:
             print(f"\n📊 {title}:")
             print("-" * len(title))
             try:
-                result = conn.execute(query).fetchdf()
-                print(result.to_string(index=False))
+                cursor = conn.execute(query, params)
+                columns = [column[0] for column in cursor.description]
+                print_rows(columns, cursor.fetchall())
             except Exception as e:
                 print(f"Query failed: {e}")
 
     except Exception as e:
         print(f"Sales querying failed: {e}")
-    finally:
-        conn.close()
 
 def demonstrate_amendment_patterns():
     """Show different patterns for handling amendments"""
@@ -316,9 +311,15 @@ def sales_amendment_demo():
     # Process amendment
     sales_table = process_sales_amendment(sales_table)
 
-    # Refresh and query
-    sales_table = catalog.load_table("sales.orders")
-    query_sales_with_amendments(sales_table)
+    # Query through one DuckDB connection, closed here once the queries finish;
+    # append() already refreshed sales_table, so its location is current
+    table_location = sales_table.location()
+    conn = connect_duckdb()
+    try:
+        query_sales_with_amendments(conn, table_location)
+    finally:
+        if conn is not None:
+            conn.close()
 
     # Show patterns
     demonstrate_amendment_patterns()
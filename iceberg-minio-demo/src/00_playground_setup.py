@@ -10,10 +10,13 @@ This script demonstrates:
 """
 
 import os
+import random
+import secrets
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import UTC, datetime
 from pathlib import Path
 
-import boto3
 from botocore.exceptions import ClientError, NoCredentialsError
 from dotenv import load_dotenv
 from rich.console import Console
@@ -22,6 +25,9 @@ from rich.table import Table
 
 console = Console()
 
+# Bucket names tried before create_playground_bucket gives up
+BUCKET_NAME_ATTEMPTS = 5
+
 
 def load_playground_environment():
     """Load MinIO playground environment configuration"""
@@ -75,6 +81,10 @@ def test_playground_connection():
     console.print("="*60)
     
     try:
+        # Imported here: only this step creates the S3 client
+        import boto3
+        from botocore.config import Config
+        
         # Get playground credentials
         endpoint = os.getenv('MINIO_ENDPOINT')
         access_key = os.getenv('MINIO_ACCESS_KEY')
@@ -83,18 +93,32 @@ def test_playground_connection():
         
         console.print(f"🔗 Connecting to: [bold blue]{endpoint}[/bold blue]")
         
+        # One client, created here and passed to every later step, so its
+        # pooled keep-alive connections are reused across requests
+        config = Config(
+            region_name=region,
+            retries={
+                'max_attempts': 3,
+                'mode': 'adaptive'
+            },
+            max_pool_connections=20,
+            tcp_keepalive=True,
+            s3={'addressing_style': 'path'},
+        )
+        
         # Create S3 client for playground
         s3_client = boto3.client(
             's3',
             endpoint_url=endpoint,
             aws_access_key_id=access_key,
             aws_secret_access_key=secret_key,
-            region_name=region,
-            use_ssl=True,  # Playground uses HTTPS
-            verify=True
+            # The https:// endpoint already means TLS, and certificates
+            # are verified by default, so no use_ssl/verify overrides
+            config=config,
         )
         
-        # Test basic connectivity
+        # Test basic connectivity (list_buckets returns every bucket on the
+        # shared server; only the first 10 are displayed below)
         response = s3_client.list_buckets()
         
         console.print("✅ Successfully connected to MinIO playground!")
@@ -145,39 +169,37 @@ def create_playground_bucket(s3_client):
     console.print("📦 CREATING PLAYGROUND BUCKET")
     console.print("="*60)
     
-    import random
-    import string
-    
-    # Create a unique bucket name
-    random_suffix = ''.join(random.choices(string.ascii_lowercase + string.digits, k=8))
-    bucket_name = f"iceberg-playground-{random_suffix}"
-    
-    try:
-        # Create bucket
-        console.print(f"🔧 Creating bucket: [bold]{bucket_name}[/bold]")
-        s3_client.create_bucket(Bucket=bucket_name)
-        
-        console.print(f"✅ Created bucket: [green]{bucket_name}[/green]")
-        console.print(f"   💡 Remember this bucket name for later steps")
-        
-        # Update environment variable for other scripts
-        os.environ['PLAYGROUND_BUCKET'] = bucket_name
-        
-        return bucket_name
-        
-    except ClientError as e:
-        error_code = e.response['Error']['Code']
-        if error_code == 'BucketAlreadyExists':
-            console.print(f"ℹ️  Bucket name [yellow]{bucket_name}[/yellow] already exists")
-            console.print("   Trying a different name...")
-            # Recursive retry with different suffix
-            return create_playground_bucket(s3_client)
-        else:
-            console.print(f"❌ Failed to create bucket: {e}")
+    # The playground is shared, so retry a few times with fresh random names
+    for _ in range(BUCKET_NAME_ATTEMPTS):
+        bucket_name = f"iceberg-playground-{secrets.token_hex(6)}"
+
+        try:
+            # Create bucket
+            console.print(f"🔧 Creating bucket: [bold]{bucket_name}[/bold]")
+            s3_client.create_bucket(Bucket=bucket_name)
+            
+            console.print(f"✅ Created bucket: [green]{bucket_name}[/green]")
+            console.print(f"   💡 Remember this bucket name for later steps")
+            
+            # Update environment variable for other scripts
+            os.environ['PLAYGROUND_BUCKET'] = bucket_name
+            
+            return bucket_name
+            
+        except ClientError as e:
+            error_code = e.response['Error']['Code']
+            if error_code == 'BucketAlreadyExists':
+                console.print(f"ℹ️  Bucket name [yellow]{bucket_name}[/yellow] already exists")
+                console.print("   Trying a different name...")
+            else:
+                console.print(f"❌ Failed to create bucket: {e}")
+                return None
+        except Exception as e:
+            console.print(f"❌ Unexpected error creating bucket: {e}")
             return None
-    except Exception as e:
-        console.print(f"❌ Unexpected error creating bucket: {e}")
-        return None
+
+    console.print(f"❌ No free bucket name after {BUCKET_NAME_ATTEMPTS} attempts")
+    return None
 
 
 def test_playground_operations(s3_client, bucket_name):
@@ -187,7 +209,8 @@ def test_playground_operations(s3_client, bucket_name):
     console.print("="*60)
     
     test_key = f"test-{random.randint(1000, 9999)}/hello.txt"
-    test_content = f"Hello from MinIO playground! Timestamp: {pd.Timestamp.now()}"
+    timestamp = datetime.now(UTC).isoformat()
+    test_content = f"Hello from MinIO playground! Timestamp: {timestamp}"
     
     try:
         # Test write
@@ -200,18 +223,24 @@ def test_playground_operations(s3_client, bucket_name):
         )
         console.print("✅ Write test successful")
         
-        # Test read
-        console.print(f"📖 Reading test file...")
-        response = s3_client.get_object(Bucket=bucket_name, Key=test_key)
-        content = response['Body'].read().decode('utf-8')
+        # Test read and list: both only need the written object, so run them
+        # side by side instead of waiting out two round trips in a row
+        console.print(f"📖 Reading test file and 📋 listing objects...")
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            read_future = executor.submit(
+                lambda: s3_client.get_object(Bucket=bucket_name, Key=test_key)['Body'].read()
+            )
+            # A handful of keys proves listing works; no need to page the bucket
+            list_future = executor.submit(s3_client.list_objects_v2, Bucket=bucket_name, MaxKeys=10)
+        
+        content = read_future.result().decode('utf-8')
         console.print(f"✅ Read test successful: {len(content)} bytes")
         console.print(f"   Content preview: [dim]{content[:50]}...[/dim]")
         
-        # Test list
-        console.print(f"📋 Listing objects...")
-        response = s3_client.list_objects_v2(Bucket=bucket_name)
+        response = list_future.result()
         objects = response.get('Contents', [])
-        console.print(f"✅ List test successful: found {len(objects)} objects")
+        more = " (more not listed)" if response.get('IsTruncated') else ""
+        console.print(f"✅ List test successful: found {len(objects)} objects{more}")
         
         return True
         
@@ -314,8 +343,5 @@ def main():
 
 
 if __name__ == "__main__":
-    import random
-    import pandas as pd  # For timestamp
-    
     success = main()
     sys.exit(0 if success else 1)
\ No newline at end of file
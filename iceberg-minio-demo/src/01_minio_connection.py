@@ -10,18 +10,20 @@ This script demonstrates:
 - Debugging common connection issues
 """
 
-import os
+import json
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import UTC, datetime
 from pathlib import Path
 
-import boto3
-import pandas as pd
 from botocore.exceptions import ClientError, NoCredentialsError
 from dotenv import load_dotenv
-from rich.console import Console
 from rich.table import Table
 
-console = Console()
+from minio_common import RULE, console, create_s3_client, get_config, section
+
+# Created on first use by get_minio_client() and shared by every later call
+_S3_CLIENT = None
 
 
 def load_environment():
@@ -38,37 +40,30 @@ def load_environment():
 
 
 def get_minio_client():
-    """Create S3 client for local MinIO instance"""
+    """Return the S3 client for the local MinIO instance, creating it once
+
+    boto3 clients are thread-safe and pool their HTTP connections, so one
+    client serves all the checks below.
+    """
+    global _S3_CLIENT
+    if _S3_CLIENT is not None:
+        return _S3_CLIENT
     
-    # Load environment configuration
+    # Environment configuration with sensible defaults
     load_environment()
+    minio_config = get_config()
     
-    # Get configuration from environment with sensible defaults
-    endpoint_url = os.getenv('MINIO_ENDPOINT', 'http://localhost:9000')
-    access_key = os.getenv('MINIO_ACCESS_KEY', 'minioadmin')
-    secret_key = os.getenv('MINIO_SECRET_KEY', 'minioadmin')
-    region = os.getenv('MINIO_REGION', 'us-east-1')
+    console.print(f"🔗 Connecting to MinIO at: [bold blue]{minio_config.endpoint}[/bold blue]")
+    masked_key = f"{minio_config.access_key[:8]}..."  # Mask for security
+    console.print(f"📂 Using access key: [bold yellow]{masked_key}[/bold yellow]")
     
-    console.print(f"🔗 Connecting to MinIO at: [bold blue]{endpoint_url}[/bold blue]")
-    console.print(f"📂 Using access key: [bold yellow]{access_key[:8]}...[/bold yellow]")  # Mask for security
-    
-    return boto3.client(
-        's3',
-        endpoint_url=endpoint_url,
-        aws_access_key_id=access_key,
-        aws_secret_access_key=secret_key,
-        region_name=region,
-        # For local development, disable SSL verification
-        use_ssl=False,
-        verify=False
-    )
+    _S3_CLIENT = create_s3_client(minio_config)
+    return _S3_CLIENT
 
 
 def test_basic_connectivity(s3_client):
     """Test basic S3 API connectivity"""
-    console.print("\n" + "="*60)
-    console.print("🧪 TESTING BASIC CONNECTIVITY")
-    console.print("="*60)
+    section("🧪 TESTING BASIC CONNECTIVITY")
     
     try:
         # List buckets (basic connectivity test)
@@ -111,11 +106,33 @@ def test_basic_connectivity(s3_client):
         return False
 
 
+def ensure_bucket(s3_client, bucket_name):
+    """Create a bucket unless it exists; returns (status, bucket_name, error)"""
+    # Try CreateBucket first: one round trip on a first run, and a bucket we
+    # already own comes back as BucketAlreadyOwnedByYou
+    try:
+        s3_client.create_bucket(Bucket=bucket_name)
+        return 'created', bucket_name, None
+    except ClientError as e:
+        error_code = e.response['Error']['Code']
+        if error_code == 'BucketAlreadyOwnedByYou':
+            return 'exists', bucket_name, None
+        if error_code == 'BucketAlreadyExists':
+            return 'error', bucket_name, f"Bucket {bucket_name} is owned by another account"
+        if error_code != 'AccessDenied':
+            return 'error', bucket_name, f"Failed to create bucket {bucket_name}: {e}"
+    
+    # Keys without s3:CreateBucket can still use a bucket that already exists
+    try:
+        s3_client.head_bucket(Bucket=bucket_name)
+        return 'exists', bucket_name, None
+    except ClientError as e:
+        return 'error', bucket_name, f"Error checking bucket {bucket_name}: {e}"
+
+
 def create_iceberg_buckets(s3_client):
     """Create buckets needed for Iceberg storage"""
-    console.print("\n" + "="*60)
-    console.print("📦 CREATING ICEBERG BUCKETS")
-    console.print("="*60)
+    section("📦 CREATING ICEBERG BUCKETS")
     
     # Buckets we need for Iceberg
     required_buckets = [
@@ -123,29 +140,27 @@ def create_iceberg_buckets(s3_client):
         'iceberg-catalog',    # Catalog metadata (if using S3 catalog)
     ]
     
+    # Each bucket is usually a single CreateBucket round trip; issue them side by side
+    with ThreadPoolExecutor(max_workers=len(required_buckets)) as executor:
+        results = list(executor.map(lambda name: ensure_bucket(s3_client, name), required_buckets))
+    
     created_buckets = []
     existing_buckets = []
+    failed = False
     
-    for bucket_name in required_buckets:
-        try:
-            # Check if bucket already exists
-            s3_client.head_bucket(Bucket=bucket_name)
+    for status, bucket_name, error in results:
+        if status == 'exists':
             existing_buckets.append(bucket_name)
             console.print(f"ℹ️  Bucket [yellow]{bucket_name}[/yellow] already exists")
-            
-        except ClientError as e:
-            if e.response['Error']['Code'] == '404':
-                # Bucket doesn't exist, create it
-                try:
-                    s3_client.create_bucket(Bucket=bucket_name)
-                    created_buckets.append(bucket_name)
-                    console.print(f"✅ Created bucket [green]{bucket_name}[/green]")
-                except ClientError as create_error:
-                    console.print(f"❌ Failed to create bucket {bucket_name}: {create_error}")
-                    return False
-            else:
-                console.print(f"❌ Error checking bucket {bucket_name}: {e}")
-                return False
+        elif status == 'created':
+            created_buckets.append(bucket_name)
+            console.print(f"✅ Created bucket [green]{bucket_name}[/green]")
+        else:
+            console.print(f"❌ {error}")
+            failed = True
+    
+    if failed:
+        return False
     
     # Summary
     if created_buckets:
@@ -158,9 +173,7 @@ def create_iceberg_buckets(s3_client):
 
 def test_read_write_permissions(s3_client):
     """Test read/write permissions with a sample file"""
-    console.print("\n" + "="*60)
-    console.print("✍️  TESTING READ/WRITE PERMISSIONS")
-    console.print("="*60)
+    section("✍️  TESTING READ/WRITE PERMISSIONS")
     
     bucket_name = 'iceberg-warehouse'
     test_key = 'connection-test/sample.json'
@@ -168,7 +181,7 @@ def test_read_write_permissions(s3_client):
     # Create test data
     test_data = {
         'message': 'Hello from PyIceberg + MinIO!',
-        'timestamp': pd.Timestamp.now().isoformat(),
+        'timestamp': datetime.now(UTC).isoformat(),
         'test_type': 'connection_verification'
     }
     
@@ -178,7 +191,7 @@ def test_read_write_permissions(s3_client):
         s3_client.put_object(
             Bucket=bucket_name,
             Key=test_key,
-            Body=pd.Series(test_data).to_json(),
+            Body=json.dumps(test_data).encode('utf-8'),
             ContentType='application/json'
         )
         console.print("✅ Write test successful")
@@ -217,11 +230,10 @@ def test_read_write_permissions(s3_client):
 
 def display_minio_info(s3_client):
     """Display useful MinIO instance information"""
-    console.print("\n" + "="*60)
-    console.print("ℹ️  MINIO INSTANCE INFORMATION")
-    console.print("="*60)
+    section("ℹ️  MINIO INSTANCE INFORMATION")
     
-    endpoint_url = os.getenv('MINIO_ENDPOINT', 'http://localhost:9000')
+    minio_config = get_config()
+    endpoint_url = minio_config.endpoint
     console_url = endpoint_url.replace(':9000', ':9001')
     
     info_table = Table(title="MinIO Configuration")
@@ -230,8 +242,8 @@ def display_minio_info(s3_client):
     
     info_table.add_row("API Endpoint", endpoint_url)
     info_table.add_row("Console URL", console_url)
-    info_table.add_row("Access Key", os.getenv('MINIO_ACCESS_KEY', 'minioadmin'))
-    info_table.add_row("Region", os.getenv('MINIO_REGION', 'us-east-1'))
+    info_table.add_row("Access Key", minio_config.access_key)
+    info_table.add_row("Region", minio_config.region)
     
     console.print(info_table)
     
@@ -242,7 +254,7 @@ def display_minio_info(s3_client):
 def main():
     """Main execution flow"""
     console.print("🚀 MinIO Connection Test for Apache Iceberg")
-    console.print("=" * 60)
+    console.print(RULE)
     
     # Test sequence
     tests_passed = 0
@@ -275,9 +287,7 @@ def main():
     tests_passed += 1
     
     # Results summary
-    console.print("\n" + "="*60)
-    console.print("📊 TEST RESULTS SUMMARY")
-    console.print("="*60)
+    section("📊 TEST RESULTS SUMMARY")
     
     if tests_passed == total_tests:
         console.print(f"🎉 All tests passed! ({tests_passed}/{total_tests})")
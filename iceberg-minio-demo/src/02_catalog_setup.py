@@ -12,15 +12,23 @@ This script demonstrates:
 
 import os
 import sys
+from functools import lru_cache
 from pathlib import Path
 
 import yaml
 from dotenv import load_dotenv
 from pyiceberg.catalog import load_catalog
-from rich.console import Console
+from pyiceberg.catalog.sql import IcebergTables, SqlCatalog
 from rich.table import Table
+from sqlalchemy import select
 
-console = Console()
+from minio_common import RULE, console, create_s3_client, get_config, section
+
+# Created on first use by get_s3_client() and shared by every later call
+_S3_CLIENT = None
+
+# Objects shown by verify_minio_bucket_structure()
+MAX_LISTED_OBJECTS = 50
 
 
 def load_config(config_name='local'):
@@ -114,9 +122,7 @@ def setup_environment_variables():
 
 def create_pyiceberg_config(catalog_config):
     """Create .pyiceberg.yaml configuration file"""
-    console.print("\n" + "="*60)
-    console.print("📄 CREATING PYICEBERG CONFIGURATION")
-    console.print("="*60)
+    section("📄 CREATING PYICEBERG CONFIGURATION")
     
     config_file = Path('.pyiceberg.yaml')
     
@@ -128,16 +134,14 @@ def create_pyiceberg_config(catalog_config):
     
     # Create configuration
     try:
-        with open(config_file, 'w') as f:
-            yaml.dump(catalog_config, f, default_flow_style=False)
+        content = yaml.safe_dump(catalog_config, default_flow_style=False)
+        config_file.write_text(content)
         
         console.print(f"✅ Created PyIceberg configuration: [green]{config_file}[/green]")
         
-        # Display the configuration
+        # Display the configuration we just wrote
         console.print("\n📋 Configuration contents:")
-        with open(config_file, 'r') as f:
-            content = f.read()
-            console.print(f"[dim]{content}[/dim]")
+        console.print(f"[dim]{content}[/dim]")
         
         return str(config_file.resolve())
         
@@ -146,36 +150,39 @@ def create_pyiceberg_config(catalog_config):
         return None
 
 
+@lru_cache(maxsize=4)
+def get_catalog(catalog_name):
+    """Load a catalog once, configured from the current environment
+
+    PyIceberg reads .pyiceberg.yaml and PYICEBERG_* variables when it is
+    imported, before this script has set either up, so every property is
+    passed explicitly instead.
+    """
+    minio_config = get_config()
+    prefix = f"PYICEBERG_CATALOG__{catalog_name.upper()}__"
+    
+    return load_catalog(
+        catalog_name,
+        **{
+            "type": os.getenv(f"{prefix}TYPE", "sql"),
+            "uri": os.getenv(f"{prefix}URI", "sqlite:///catalog.db"),
+            "warehouse": os.getenv(f"{prefix}WAREHOUSE", "s3://iceberg-warehouse/"),
+            "s3.endpoint": minio_config.endpoint,
+            "s3.access-key-id": minio_config.access_key,
+            "s3.secret-access-key": minio_config.secret_key,
+            "s3.region": minio_config.region,
+            "s3.path-style-access": "true"
+        }
+    )
+
+
 def test_catalog_connection(catalog_name='minio_local'):
     """Test connection to the Iceberg catalog"""
-    console.print("\n" + "="*60)
-    console.print("🔌 TESTING CATALOG CONNECTION")
-    console.print("="*60)
+    section("🔌 TESTING CATALOG CONNECTION")
     
     try:
-        # Try loading with direct configuration first
         console.print(f"🔄 Loading catalog: [bold]{catalog_name}[/bold]")
-        
-        # Direct configuration approach as fallback
-        try:
-            catalog = load_catalog(
-                catalog_name,
-                **{
-                    "type": "sql",
-                    "uri": "sqlite:///catalog.db",
-                    "warehouse": "s3://iceberg-warehouse/",
-                    "s3.endpoint": "http://localhost:9000",
-                    "s3.access-key-id": "minioadmin",
-                    "s3.secret-access-key": "minioadmin",
-                    "s3.region": "us-east-1",
-                    "s3.path-style-access": "true"
-                }
-            )
-            console.print("✅ Loaded catalog using direct configuration")
-        except Exception as direct_error:
-            console.print(f"⚠️  Direct config failed: {direct_error}")
-            console.print("🔄 Trying environment variable approach...")
-            catalog = load_catalog(catalog_name)
+        catalog = get_catalog(catalog_name)
         
         console.print("✅ Successfully loaded catalog!")
         console.print(f"   Catalog type: [yellow]{type(catalog).__name__}[/yellow]")
@@ -218,9 +225,7 @@ def test_catalog_connection(catalog_name='minio_local'):
 
 def create_test_namespace(catalog):
     """Create a test namespace to verify catalog write permissions"""
-    console.print("\n" + "="*60)
-    console.print("📁 TESTING NAMESPACE CREATION")
-    console.print("="*60)
+    section("📁 TESTING NAMESPACE CREATION")
     
     namespace_name = "minio_test"
     
@@ -252,11 +257,32 @@ def create_test_namespace(catalog):
         return False
 
 
+def list_tables_by_namespace(catalog, namespaces):
+    """Map each namespace to its tables
+
+    A SQL catalog answers with one query over iceberg_tables; other catalog
+    types get one list_tables() call per namespace.
+    """
+    if isinstance(catalog, SqlCatalog):
+        tables = {namespace: [] for namespace in namespaces}
+        query = (
+            select(IcebergTables.table_namespace, IcebergTables.table_name)
+            .where(IcebergTables.catalog_name == catalog.name)
+            .order_by(IcebergTables.table_namespace, IcebergTables.table_name)
+        )
+        with catalog.engine.connect() as conn:
+            for table_namespace, table_name in conn.execute(query):
+                namespace = tuple(table_namespace.split('.'))
+                if namespace in tables:
+                    tables[namespace].append((*namespace, table_name))
+        return tables
+    
+    return {namespace: list(catalog.list_tables(namespace)) for namespace in namespaces}
+
+
 def display_catalog_info(catalog):
     """Display detailed catalog information"""
-    console.print("\n" + "="*60)
-    console.print("ℹ️  CATALOG INFORMATION")
-    console.print("="*60)
+    section("ℹ️  CATALOG INFORMATION")
     
     info_table = Table(title="Catalog Configuration")
     info_table.add_column("Property", style="cyan")
@@ -285,15 +311,17 @@ def display_catalog_info(catalog):
             console.print(f"\n📂 Available namespaces: {namespaces}")
             
             # List tables in each namespace
-            for namespace in namespaces:
-                try:
-                    tables = list(catalog.list_tables(namespace))
-                    if tables:
-                        console.print(f"   └── Tables in {namespace}: {tables}")
-                    else:
-                        console.print(f"   └── No tables in {namespace}")
-                except Exception as e:
-                    console.print(f"   └── Could not list tables in {namespace}: {e}")
+            try:
+                tables_by_namespace = list_tables_by_namespace(catalog, namespaces)
+            except Exception as e:
+                console.print(f"   └── Could not list tables: {e}")
+                tables_by_namespace = {}
+            
+            for namespace, tables in tables_by_namespace.items():
+                if tables:
+                    console.print(f"   └── Tables in {namespace}: {tables}")
+                else:
+                    console.print(f"   └── No tables in {namespace}")
         else:
             console.print("\n📂 No namespaces found (catalog is empty)")
             
@@ -301,48 +329,55 @@ def display_catalog_info(catalog):
         console.print(f"\nℹ️  Could not list namespaces: {e}")
 
 
+def get_s3_client():
+    """Return the S3 client for MinIO, creating it once (same settings as step 1)"""
+    global _S3_CLIENT
+    if _S3_CLIENT is None:
+        _S3_CLIENT = create_s3_client(get_config())
+    return _S3_CLIENT
+
+
 def verify_minio_bucket_structure():
     """Check what files were created in MinIO bucket"""
-    console.print("\n" + "="*60)
-    console.print("🗂️  VERIFYING MINIO BUCKET STRUCTURE")
-    console.print("="*60)
+    section("🗂️  VERIFYING MINIO BUCKET STRUCTURE")
     
     try:
-        import boto3
-        
         # Get MinIO client using same config
-        s3_client = boto3.client(
-            's3',
-            endpoint_url=os.getenv('MINIO_ENDPOINT', 'http://localhost:9000'),
-            aws_access_key_id=os.getenv('MINIO_ACCESS_KEY', 'minioadmin'),
-            aws_secret_access_key=os.getenv('MINIO_SECRET_KEY', 'minioadmin'),
-            region_name=os.getenv('MINIO_REGION', 'us-east-1'),
-            use_ssl=False,
-            verify=False
-        )
+        s3_client = get_s3_client()
         
-        # List objects in warehouse bucket
+        # List objects in warehouse bucket, a page at a time and only as
+        # many as are worth showing
         bucket_name = 'iceberg-warehouse'
-        response = s3_client.list_objects_v2(Bucket=bucket_name)
+        paginator = s3_client.get_paginator('list_objects_v2')
+        pages = paginator.paginate(
+            Bucket=bucket_name,
+            PaginationConfig={'MaxItems': MAX_LISTED_OBJECTS, 'PageSize': MAX_LISTED_OBJECTS}
+        )
         
-        objects = response.get('Contents', [])
+        file_table = Table()
+        file_table.add_column("Key", style="cyan")
+        file_table.add_column("Size", style="green")
+        file_table.add_column("Modified", style="yellow")
         
-        if objects:
-            console.print(f"📁 Found {len(objects)} objects in bucket [yellow]{bucket_name}[/yellow]:")
-            
-            file_table = Table()
-            file_table.add_column("Key", style="cyan")
-            file_table.add_column("Size", style="green")
-            file_table.add_column("Modified", style="yellow")
-            
-            for obj in objects:
+        object_count = 0
+        truncated = False
+        for page in pages:
+            for obj in page.get('Contents', []):
                 file_table.add_row(
                     obj['Key'],
                     f"{obj['Size']} bytes",
                     obj['LastModified'].strftime('%Y-%m-%d %H:%M:%S')
                 )
-            
+                object_count += 1
+            truncated = page.get('IsTruncated', False)
+        
+        if object_count:
+            console.print(
+                f"📁 Found {object_count} objects in bucket [yellow]{bucket_name}[/yellow]:"
+            )
             console.print(file_table)
+            if truncated:
+                console.print(f"   …and more (showing the first {MAX_LISTED_OBJECTS})")
         else:
             console.print(f"📁 Bucket [yellow]{bucket_name}[/yellow] is empty")
             console.print("   This is normal if no tables have been created yet")
@@ -354,7 +389,7 @@ def verify_minio_bucket_structure():
 def main():
     """Main execution flow"""
     console.print("🔧 Iceberg Catalog Setup with MinIO")
-    console.print("=" * 60)
+    console.print(RULE)
     
     # Setup sequence
     steps_completed = 0
@@ -396,9 +431,7 @@ def main():
     verify_minio_bucket_structure()
     
     # Results summary
-    console.print("\n" + "="*60)
-    console.print("📊 SETUP RESULTS SUMMARY")
-    console.print("="*60)
+    section("📊 SETUP RESULTS SUMMARY")
     
     if steps_completed == total_steps:
         console.print(f"🎉 Catalog setup complete! ({steps_completed}/{total_steps})")
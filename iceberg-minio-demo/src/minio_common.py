@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Helpers shared by the MinIO setup steps
+
+Steps 1 and 2 import this module (it sits next to them in src/) for their
+console output, MinIO settings and S3 client configuration.
+"""
+
+import os
+from dataclasses import dataclass
+from functools import lru_cache
+
+from rich.console import Console
+
+console = Console()
+
+RULE = "=" * 60
+
+
+def section(title):
+    """Print a section banner in a single console call"""
+    console.print(f"\n{RULE}\n{title}\n{RULE}")
+
+
+@dataclass(frozen=True)
+class MinioConfig:
+    """MinIO connection settings resolved from the environment"""
+    endpoint: str
+    access_key: str
+    secret_key: str
+    region: str
+
+
+@lru_cache(maxsize=1)
+def get_config():
+    """Read the MinIO settings once; load .env into the environment first"""
+    return MinioConfig(
+        endpoint=os.getenv('MINIO_ENDPOINT', 'http://localhost:9000'),
+        access_key=os.getenv('MINIO_ACCESS_KEY', 'minioadmin'),
+        secret_key=os.getenv('MINIO_SECRET_KEY', 'minioadmin'),
+        region=os.getenv('MINIO_REGION', 'us-east-1'),
+    )
+
+
+def create_s3_client(minio_config):
+    """Create an S3 client for MinIO with keep-alive, pooling and retries
+
+    boto3 clients are thread-safe and pool their HTTP connections, so each
+    step creates one and reuses it.
+    """
+    # Imported here: step 2 only needs S3 for its final bucket check
+    import boto3
+    from botocore.config import Config
+
+    config = Config(
+        region_name=minio_config.region,
+        retries={
+            'max_attempts': 3,
+            'mode': 'standard'
+        },
+        max_pool_connections=50,
+        tcp_keepalive=True,
+        s3={'addressing_style': 'path'},
+        signature_version='s3v4',
+    )
+
+    return boto3.client(
+        's3',
+        endpoint_url=minio_config.endpoint,
+        aws_access_key_id=minio_config.access_key,
+        aws_secret_access_key=minio_config.secret_key,
+        config=config,
+        # For local development, disable SSL verification
+        use_ssl=False,
+        verify=False
+    )